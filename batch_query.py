@@ -0,0 +1,116 @@
+# batch_query.py
+# -*- coding: utf-8 -*-
+
+"""
+批量查询：离线评测时一次跑完整个查询文件
+
+    python batch_query.py queries.jsonl results.jsonl [--workers 4] [--k 10]
+
+输入为 JSONL（每行一个对象，查询串在 "query" 或 "q" 字段，其余字段原样带到输出）
+或 TSV/纯文本（每行一个查询，含制表符时取最后一列）。
+相同查询只处理一次：先对全部不同查询分词，再对所有用到的词各取一次倒排记录，
+然后分批交给进程池计分，最后按输入顺序逐行写出 {"query": ..., "results": [...]}，
+results 与 query.search 的返回值相同。
+"""
+
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import boolean_query
+import query
+
+_postings = None
+_dates = None
+
+def read_queries(path):
+    """返回 [(查询串, 附带字段), ...]，按输入顺序"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if path.endswith(".jsonl"):
+                obj = json.loads(line)
+                if isinstance(obj, str):
+                    items.append((obj.strip(), {}))
+                    continue
+                q = obj.pop("query", None)
+                if q is None:
+                    q = obj.pop("q", "")
+                items.append((str(q).strip(), obj))
+            else:
+                items.append((line.split("\t")[-1].strip(), {}))
+    return items
+
+def gather_postings(inv, parsed):
+    """批内所有查询用到的词各取一次倒排记录（二进制索引/增量段合并只解码一次）"""
+    postings = {}
+    for tokens, author_terms, keyword_terms, condition, expansions in parsed:
+        for term in (*tokens, *author_terms, *keyword_terms, *boolean_query.node_terms(condition),
+                     *(term for term, _ in expansions)):
+            if term not in postings:
+                postings[term] = inv.get(term, {})
+    return postings
+
+def _init_rank_worker(postings, dates):
+    global _postings, _dates
+    _postings, _dates = postings, dates
+
+def _rank_chunk(chunk, exhaustive, k, proximity):
+    return [query.rank_query(_postings, parsed, exhaustive, k, proximity, _dates) for parsed in chunk]
+
+def rank_all(postings, parsed, exhaustive=False, k=query.TOPK, workers=1, chunk_size=64,
+             proximity=False, dates=None):
+    """按输入顺序逐个产出每个查询的排序结果；workers > 1 时分批交给进程池"""
+    if workers <= 1 or len(parsed) <= chunk_size:
+        for p in parsed:
+            yield query.rank_query(postings, p, exhaustive, k, proximity, dates)
+        return
+    chunks = [parsed[i:i + chunk_size] for i in range(0, len(parsed), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_rank_worker,
+                             initargs=(postings, dates)) as pool:
+        # map 按提交顺序返回
+        for ranked_chunk in pool.map(_rank_chunk, chunks, [exhaustive] * len(chunks),
+                                     [k] * len(chunks), [proximity] * len(chunks)):
+            yield from ranked_chunk
+
+def run_batch(docs, inv, term_dict, highlighter, items, out,
+              exhaustive=False, k=query.TOPK, workers=1, proximity=False):
+    distinct = list(dict.fromkeys(q for q, _ in items))
+    parsed = [query.parse_query(term_dict, q) for q in distinct]
+    postings = gather_postings(inv, parsed)
+
+    # distinct 按首次出现排序，输入中每遇到一个新查询恰好取下一个排序结果，可以边算边写
+    ranked_iter = rank_all(postings, parsed, exhaustive, k, workers, proximity=proximity,
+                           dates=query.doc_dates(docs, inv))
+    results = {}
+    for q, extra in items:
+        if q not in results:
+            results[q] = query.render_results(docs, highlighter, next(ranked_iter))
+        out.write(json.dumps({**extra, "query": q, "results": results[q]},
+                             ensure_ascii=False) + "\n")
+    return len(distinct)
+
+def main():
+    parser = argparse.ArgumentParser(description="批量查询")
+    parser.add_argument("queries", help="查询文件（.jsonl 或每行一个查询的 TSV/文本）")
+    parser.add_argument("output", help="结果 JSONL")
+    parser.add_argument("--format", choices=("json", "bin"), default="json",
+                        help="索引文件格式：json 读 re_idx.json，bin 读 re_idx.bin")
+    parser.add_argument("--k", type=int, default=query.TOPK)
+    parser.add_argument("--workers", type=int, default=1, help="计分进程数")
+    parser.add_argument("--exhaustive", action="store_true", help="不剪枝，对全部倒排记录计分")
+    parser.add_argument("--proximity", action="store_true", help="按查询词在标题/摘要中的邻近度加分")
+    args = parser.parse_args()
+
+    docs, inv, term_dict, highlighter = query.load_data(args.format)
+    items = read_queries(args.queries)
+    with open(args.output, "w", encoding="utf-8") as out:
+        n = run_batch(docs, inv, term_dict, highlighter, items, out,
+                      args.exhaustive, args.k, args.workers, args.proximity)
+    print(f"共 {len(items)} 个查询（{n} 个不同），结果已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+# bench.py
+# -*- coding: utf-8 -*-
+
+"""
+基于合成语料的性能测试，在项目根目录运行，例如：
+    python bench.py tf --docs 100000
+    python bench.py seg --docs 20000 --workers 1 2 4 8
+    python bench.py topk --docs 50000
+    python bench.py phrase --docs 50000
+    python bench.py bool --docs 50000
+    python bench.py shards --docs 50000 --shards 1 2 4 --clients 8
+    python bench.py memory --docs 50000
+    python bench.py stream --docs 30000 --memory-mb 16
+    python bench.py crawl
+"""
+
+import argparse
+import filecmp
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import create_rev_table
+
+def synthetic_positions(n_docs, vocab_size=50000, seed=0):
+    """按 Zipf 分布生成各文档标题/摘要的 {词: [位置]} 表，跳过分词直接测试索引构建"""
+    rng = np.random.default_rng(seed)
+    vocab = [f"t{i}" for i in range(vocab_size)]
+    title_list, abstract_list = [], []
+    for _ in range(n_docs):
+        for out, length in ((title_list, rng.integers(0, 13)), (abstract_list, rng.integers(30, 151))):
+            ids = np.minimum(rng.zipf(1.3, length), vocab_size) - 1
+            pos = defaultdict(list)
+            for i, tid in enumerate(ids.tolist()):
+                pos[vocab[tid]].append(i)
+            out.append(pos)
+    return title_list, abstract_list
+
+def synthetic_docs(n_docs, seed=0):
+    """用 raw_scores.txt 中的词随机拼出标题/摘要，生成 papers.json 格式的文档"""
+    with open("raw_scores.txt", encoding="utf-8") as f:
+        vocab = np.array([line.split("\t")[0] for line in f.read().splitlines()[1:]])
+    rng = np.random.default_rng(seed)
+    docs = []
+    for i in range(n_docs):
+        words = rng.choice(vocab, rng.integers(0, 9) + rng.integers(30, 121))
+        n_title = rng.integers(0, 9)
+        docs.append({
+            "title": "".join(words[:n_title]),
+            "author": [f"作者{a}" for a in rng.integers(0, 5000, rng.integers(0, 6))],
+            "date": "2020-01-01",
+            "abstract": "".join(words[n_title:]),
+            "keyword": [str(k) for k in rng.choice(vocab, rng.integers(0, 6))],
+            "url": f"https://example.com/{i}",
+        })
+    return docs
+
+def reference_term_scores(title_list, abstract_list):
+    """旧实现：对每个词的每篇文档重新累加整篇文档长度"""
+    total_docs = len(title_list)
+    df = defaultdict(set)
+    for doc_id in range(total_docs):
+        for term in title_list[doc_id]:
+            df[term].add(doc_id)
+        for term in abstract_list[doc_id]:
+            df[term].add(doc_id)
+    rows = []
+    for term, doc_ids in df.items():
+        idf = math.log(1 + total_docs / (len(doc_ids) + 1))
+        doc_tf_sum = 0
+        for doc_id in doc_ids:
+            term_count = 0
+            doc_length = 0
+            if term in title_list[doc_id]:
+                term_count += len(title_list[doc_id][term])
+                doc_length += sum(len(poses) for poses in title_list[doc_id].values())
+            if term in abstract_list[doc_id]:
+                term_count += len(abstract_list[doc_id][term])
+                doc_length += sum(len(poses) for poses in abstract_list[doc_id].values())
+            if doc_length > 0:
+                doc_tf_sum += math.log(1 + term_count) / math.log(1 + doc_length)
+        tf = math.log(1 + doc_tf_sum)
+        raw_score = math.log(1 + math.sqrt(tf) * idf * idf * idf)
+        rows.append((term, tf, idf, raw_score, create_rev_table.sigmoid(raw_score / 3)))
+    return rows
+
+def bench_tf(args):
+    print(f"生成 {args.docs} 篇合成文档...")
+    title_list, abstract_list = synthetic_positions(args.docs)
+    postings = sum(len(set(t) | set(a)) for t, a in zip(title_list, abstract_list))
+    print(f"倒排记录数: {postings}")
+
+    t0 = time.perf_counter()
+    new_rows = create_rev_table.compute_term_scores(title_list, abstract_list)
+    t_new = time.perf_counter() - t0
+    print(f"compute_term_scores: {t_new:.2f}s")
+
+    if args.skip_reference:
+        return
+    t0 = time.perf_counter()
+    old_rows = reference_term_scores(title_list, abstract_list)
+    t_old = time.perf_counter() - t0
+    print(f"旧实现:              {t_old:.2f}s  (加速 {t_old / t_new:.1f}x)")
+    print("结果逐位一致" if new_rows == old_rows else "结果不一致！")
+
+def bench_seg(args):
+    docs = synthetic_docs(args.docs)
+    print(f"{args.docs} 篇合成文档，chunk_size={args.chunk_size}")
+    # 主进程先加载 jieba 词典，避免计入串行耗时
+    create_rev_table.jieba.initialize()
+    baseline = None
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        result = create_rev_table.segment_fields(docs, workers=workers, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - t0
+        if baseline is None:
+            baseline = (elapsed, result)
+        same = "一致" if result == baseline[1] else "不一致！"
+        print(f"workers={workers}: {elapsed:.2f}s  加速 {baseline[0] / elapsed:.2f}x  结果{same}")
+
+def synthetic_index(n_docs):
+    """合成语料的倒排索引（不写 raw_scores.txt），作者/关键词字段为空"""
+    title_list, abstract_list = synthetic_positions(n_docs)
+    term_scores = {row[0]: row[4] for row in create_rev_table.compute_term_scores(title_list, abstract_list)}
+    empty = [{} for _ in range(n_docs)]
+    return create_rev_table.build_postings(title_list, abstract_list, empty, empty, term_scores)
+
+def bench_topk(args):
+    import query
+    import topk
+    inv = synthetic_index(args.docs)
+    # Zipf 分布下编号越小的词越常见
+    queries = [["t0", "t1"], ["t0", "t2", "t5"], ["t1", "t3", "t10", "t50"],
+               ["t0", "t1", "t2", "t3", "t4", "t5"], ["t0", "t500"], ["t2", "t1000", "t3000"]]
+    print(f"{args.docs} 篇合成文档，k={query.TOPK}，每个查询重复 {args.repeat} 次；"
+          f"向量化计分不含第一次把倒排记录转成数组的耗时（单独列出，之后走缓存）")
+    for tokens in queries:
+        lists = query.scoring_lists(inv, tokens, (), ())
+        postings = sum(len(x[1]) for x in lists)
+        t0 = time.perf_counter()
+        arrays = [topk.posting_arrays(x[1]) for x in lists]
+        convert = (time.perf_counter() - t0) * 1000
+        timings = {}
+        for name, rank in (("穷举", topk.rank_exhaustive), ("MaxScore", topk.rank_maxscore),
+                           ("向量化", lambda lists, k: topk.rank_vectorized(lists, k, arrays))):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                result = rank(lists, query.TOPK)
+            timings[name] = ((time.perf_counter() - t0) / args.repeat * 1000, result)
+        same = "一致" if timings["穷举"][1] == timings["MaxScore"][1] == timings["向量化"][1] else "不一致！"
+        print(f"{' '.join(tokens):<24} 倒排记录 {postings:>7}  穷举 {timings['穷举'][0]:7.2f}ms  "
+              f"MaxScore {timings['MaxScore'][0]:7.2f}ms  向量化 {timings['向量化'][0]:6.2f}ms"
+              f"（转换 {convert:6.1f}ms）  结果{same}")
+
+def bench_phrase(args):
+    """多词查询在普通计分、邻近度加分和整句作为短语三种方式下的延迟"""
+    import query
+    from phrase import TEXT_FIELDS
+    inv = synthetic_index(args.docs)
+    queries = [["t0", "t1"], ["t0", "t2", "t5"], ["t1", "t3", "t10", "t50"],
+               ["t0", "t1", "t2", "t3", "t4", "t5"], ["t0", "t500"], ["t2", "t1000", "t3000"]]
+    print(f"{args.docs} 篇合成文档，k={query.TOPK}，每个查询重复 {args.repeat} 次")
+    for tokens in queries:
+        modes = (("普通", (tokens, (), (), None, ()), False),
+                 ("邻近度", (tokens, (), (), None, ()), True),
+                 ("短语", (tokens, (), (), ("phrase", TEXT_FIELDS, tuple(tokens)), ()), False))
+        line = f"{' '.join(tokens):<24}"
+        for name, parsed, proximity in modes:
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                result = query.rank_query(inv, parsed, k=query.TOPK, proximity=proximity)
+            line += f"  {name} {(time.perf_counter() - t0) / args.repeat * 1000:7.2f}ms"
+        line += f"  短语命中 {len(result)} 篇" if len(result) < query.TOPK else ""
+        print(line)
+
+def bench_bool(args):
+    """AND 查询（跳表求交后只对交集计分）与把同样的词当作词袋对并集计分的延迟对比"""
+    import boolean_query
+    import query
+    inv = synthetic_index(args.docs)
+    queries = [["t0", "t1"], ["t0", "t3000"], ["t1", "t3", "t10", "t50"],
+               ["t0", "t1", "t2", "t3", "t4", "t5"], ["t0", "t1", "t2", "t20000"], ["t2", "t1000", "t3000"]]
+    print(f"{args.docs} 篇合成文档，k={query.TOPK}，每个查询重复 {args.repeat} 次")
+    for tokens in queries:
+        condition = boolean_query.combine("and", [("term", None, t) for t in tokens])
+        timings = {}
+        for name, parsed in (("词袋", (tokens, (), (), None, ())), ("AND", (tokens, (), (), condition, ()))):
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                query.rank_query(inv, parsed, k=query.TOPK)
+            timings[name] = (time.perf_counter() - t0) / args.repeat * 1000
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            matched = boolean_query.evaluate(condition, lambda t: inv.get(t, {}))
+        elapsed = (time.perf_counter() - t0) / args.repeat * 1000
+        rarest = min(len(inv.get(t, {})) for t in tokens)
+        print(f"{' AND '.join(tokens):<34} 最短表 {rarest:>6}  交集 {len(matched):>6}  求交 {elapsed:7.2f}ms  "
+              f"AND 查询 {timings['AND']:7.2f}ms  词袋 {timings['词袋']:7.2f}ms")
+
+def bench_shards(args):
+    """同样的查询由多个客户端线程并发提交，比较单一索引（单进程）和不同分片数的吞吐量，并核对结果"""
+    from concurrent.futures import ThreadPoolExecutor
+    import index_shards
+    import query
+    inv = synthetic_index(args.docs)
+    rng = np.random.default_rng(0)
+    queries = [["t0", "t1"], ["t0", "t2", "t5"], ["t1", "t3", "t10", "t50"], ["t0", "t500"]]
+    queries += [[f"t{i}" for i in rng.integers(0, 2000, size=rng.integers(1, 4))] for _ in range(60)]
+    parsed = [(tokens, set(), set(), None, ()) for tokens in queries]
+
+    def run(index):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            results = list(pool.map(lambda p: query.rank_query(index, p), parsed * args.repeat))
+        return len(results) / (time.perf_counter() - start), results[:len(parsed)]
+
+    # 第一遍同时预热倒排记录数组缓存
+    expected = [query.rank_query(inv, p) for p in parsed]
+    qps, _ = run(inv)
+    print(f"{args.docs} 篇合成文档，{len(parsed)} 个查询 × {args.repeat} 遍，{args.clients} 个客户端线程，"
+          f"CPU 核数 {os.cpu_count()}")
+    print(f"单一索引: {qps:8.1f} 查询/秒")
+    root = tempfile.mkdtemp(prefix="bench_shards_")
+    try:
+        for n in args.shards:
+            manifest = index_shards.save_shards(inv, args.docs, n, "json", os.path.join(root, f"shards_{n}"))
+            coordinator = query.ShardCoordinator(manifest, [""] * args.docs)
+            try:
+                run(coordinator)
+                qps, results = run(coordinator)
+            finally:
+                coordinator.close()
+            same = "一致" if results == expected else "不一致！"
+            print(f"{n} 个分片: {qps:8.1f} 查询/秒  结果{same}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+# 子进程中载入一个 pickle，输出载入前后常驻内存之差（字节）和耗时（秒）
+_RSS_CHILD = """
+import os, pickle, sys, time
+import packed_index
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+before = rss()
+start = time.perf_counter()
+with open(sys.argv[1], "rb") as f:
+    inv = pickle.load(f)
+print(rss() - before, time.perf_counter() - start)
+"""
+
+def bench_memory(args):
+    """解析后的 dict 索引与 PackedIndex 的常驻内存对比：各自 pickle 后在新进程中载入（即启动快照的载入方式）"""
+    import pickle
+    from packed_index import PackedIndex
+    inv = synthetic_index(args.docs)
+    # 经过一次 JSON 往返，和 query.py 读 re_idx.json 一样每条倒排记录都是独立的对象
+    inv = {term: {int(d): fields for d, fields in postings.items()}
+           for term, postings in json.loads(json.dumps(inv)).items()}
+    t0 = time.perf_counter()
+    packed = PackedIndex(inv)
+    pack_time = time.perf_counter() - t0
+    n = packed.posting_count()
+    print(f"{args.docs} 篇合成文档，{len(packed)} 个词，{n} 条倒排记录，转换耗时 {pack_time:.2f}s")
+    root = tempfile.mkdtemp(prefix="bench_memory_")
+    try:
+        for name, obj in (("dict", inv), ("PackedIndex", packed)):
+            path = os.path.join(root, "index.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(path)
+            out = subprocess.run([sys.executable, "-c", _RSS_CHILD, path], capture_output=True,
+                                 text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            rss, seconds = out.stdout.split()
+            rss = int(rss)
+            print(f"{name:<12} 常驻内存 {rss / 2**20:8.1f}MB  每百万条倒排记录 {rss / n * 1e6 / 2**20:8.1f}MB"
+                  f"（{rss / n:6.1f} 字节/条）  pickle {size / 2**20:7.1f}MB  载入 {float(seconds):.2f}s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def _run_build(workdir, args):
+    """在 workdir 中运行 create_rev_table.py，返回 (耗时, 峰值内存 MB)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = ("import resource, runpy, sys; sys.path.insert(0, %r); sys.argv = ['create_rev_table.py'] + %r; "
+            "runpy.run_path(%r, run_name='__main__'); "
+            "print('MAXRSS', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+            % (here, args, os.path.join(here, "create_rev_table.py")))
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, check=True,
+                         capture_output=True, text=True).stdout
+    elapsed = time.perf_counter() - t0
+    rss_kb = int(out.rsplit("MAXRSS", 1)[1])
+    return elapsed, rss_kb / 1024
+
+def bench_stream(args):
+    """流式构建与全量构建在同一份合成语料上的输出必须逐字节相同"""
+    docs = synthetic_docs(args.docs)
+    root = tempfile.mkdtemp(prefix="bench_stream_")
+    try:
+        dirs = {}
+        for name in ("全量", "流式"):
+            d = dirs[name] = os.path.join(root, name)
+            os.makedirs(d)
+            shutil.copy("cn_stopwords.txt", d)
+            with open(os.path.join(d, "papers.json"), "w", encoding="utf-8") as f:
+                json.dump(docs, f, ensure_ascii=False, indent=4)
+        print(f"{args.docs} 篇合成文档，流式构建内存预算 {args.memory_mb}MB，索引格式 {args.format}")
+        for name, extra in (("全量", []), ("流式", ["--stream", "--memory-mb", str(args.memory_mb)])):
+            elapsed, rss = _run_build(dirs[name], ["--format", args.format] + extra)
+            print(f"{name}: {elapsed:.1f}s  峰值内存 {rss:.0f}MB")
+        index_file = "re_idx.bin" if args.format == "bin" else "re_idx.json"
+        files = [index_file, "raw_scores.txt", "doc_tokens.json", "term_dict.json", "term_expand.json",
+                 "index_stats.json"]
+        _, mismatch, errors = filecmp.cmpfiles(dirs["全量"], dirs["流式"], files, shallow=False)
+        print("输出逐字节一致" if not mismatch and not errors else f"输出不一致：{mismatch + errors}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+CRAWL_FIXTURE = "crawl_fixture"
+CRAWL_YEARS = range(2019, 2021)
+# crawl_fixture/revised/ 中第1401期删去 14012、修改 14013 的摘要、新增 14014
+CRAWL_EXPECTED_DELTA = ["/CN/abstract/abstract_14013.shtml", "/CN/abstract/abstract_14014.shtml"]
+CRAWL_EXPECTED_DELETED = ["/CN/abstract/abstract_14012.shtml", "/CN/abstract/abstract_14013.shtml"]
+
+class CrawlFixtureHandler(BaseHTTPRequestHandler):
+    """
+    本地测试站点：crawl_fixture/site/ 下保存的网页按原站点路径提供，年份页为 site/years/年份.html。
+    server.revised 为 True 时 crawl_fixture/revised/ 中的同名网页优先（模拟站点更新）；
+    server.flaky 为 True 时约三分之一的地址（按地址哈希选定）第一次请求返回 503（模拟限流/故障，考验重试和断点续爬）。
+    响应带 ETag/Last-Modified，条件请求命中时返回 304
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _file(self):
+        url = urlparse(self.path)
+        if url.path.endswith("showTenYearVolumnDetail.do"):
+            rel = os.path.join("years", parse_qs(url.query).get("nian", [""])[0] + ".html")
+        else:
+            rel = url.path.lstrip("/")
+        roots = (["revised"] if self.server.revised else []) + ["site"]
+        for root in roots:
+            path = os.path.join(CRAWL_FIXTURE, root, rel)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+            first = self.server.hits[self.path] == 1
+        if self.server.flaky and first and hashlib.sha1(self.path.encode()).digest()[0] % 3 == 0:
+            self._send(503, b"busy")
+            return
+        path = self._file()
+        if path is None:
+            self._send(404, b"not found")
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        headers = [("ETag", etag), ("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")]
+        if self.headers.get("If-None-Match") == etag:
+            self.server.not_modified += 1
+            self._send(304, headers=headers)
+            return
+        self._send(200, body, headers + [("Content-Type", "text/html; charset=utf-8")])
+
+def _crawl_fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CrawlFixtureHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.hits = {}
+    server.revised = server.flaky = False
+    server.not_modified = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_crawl(args):
+    """
+    在本地测试站点（crawl_fixture/）上核对爬虫：
+    1. 一次抓完（失败重试）作为参照；空目录页按解析失败计数，不中断抓取
+    2. 不重试地抓一遍（首次请求的 503 都算失败），再从检查点继续，结果须与参照相同，且只重新请求失败的网页
+    3. 站点更新后 --refresh 只输出新增/变化的论文和需删除的 URL，未变化的网页走 304
+    """
+    import bupt_journal_crawl as crawler
+    server = _crawl_fixture_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    root = tempfile.mkdtemp(prefix="bench_crawl_")
+    ok = True
+
+    def run(checkpoint_name, retries, flaky, refresh=False):
+        server.hits.clear()
+        server.flaky = flaky
+        fetcher = crawler.Fetcher(concurrency=args.concurrency, rate=0, retries=retries, backoff=0.01)
+        checkpoint = crawler.Checkpoint(os.path.join(root, checkpoint_name))
+        try:
+            if refresh:
+                return crawler.refresh(fetcher, checkpoint, CRAWL_YEARS, base_url)
+            return crawler.crawl(fetcher, checkpoint, CRAWL_YEARS, base_url)
+        finally:
+            checkpoint.close()
+
+    def check(name, passed):
+        nonlocal ok
+        ok = ok and passed
+        print(f"{name}：{'通过' if passed else '不符'}")
+
+    try:
+        papers, failed = run("reference.jsonl", retries=3, flaky=True)
+        expected = [p.to_dict() for p in papers]
+        print(f"参照：{len(expected)} 篇论文，{failed} 个网页失败，共请求 {sum(server.hits.values())} 次")
+        check("空目录页按解析失败计数（1 个）", failed == 1)
+
+        _, failed = run("resume.jsonl", retries=0, flaky=True)
+        with open(os.path.join(root, "resume.jsonl"), encoding="utf-8") as f:
+            recorded = {json.loads(line)["url"][len(base_url):] for line in f}
+        print(f"不重试：{failed} 个网页失败，{len(recorded)} 个写入检查点")
+        papers, failed = run("resume.jsonl", retries=3, flaky=False)
+        requested = set(server.hits)
+        print(f"从检查点继续：{failed} 个网页失败，请求 {len(requested)} 个网页")
+        check("断点续爬结果与参照相同", [p.to_dict() for p in papers] == expected)
+        check("续爬不重新请求检查点中已有的网页", not recorded & requested)
+
+        server.revised = True
+        delta, deleted, failed = run("resume.jsonl", retries=3, flaky=False, refresh=True)
+        delta_paths = [urlparse(p.url).path for p in delta]
+        deleted_paths = [urlparse(url).path for url in deleted]
+        print(f"刷新：新增/变化 {delta_paths}，删除 {deleted_paths}，304 共 {server.not_modified} 次")
+        check("刷新结果符合预期", delta_paths == CRAWL_EXPECTED_DELTA and deleted_paths == CRAWL_EXPECTED_DELETED)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(root, ignore_errors=True)
+    print("全部通过" if ok else "有检查不符")
+    if not ok:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="合成语料性能测试")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("tf", help="词分数计算（TF/IDF/sigmoid）新旧实现对比")
+    p.add_argument("--docs", type=int, default=100000)
+    p.add_argument("--skip-reference", action="store_true", help="不运行旧实现")
+    p.set_defaults(func=bench_tf)
+
+    p = sub.add_parser("seg", help="多进程分词扩展性")
+    p.add_argument("--docs", type=int, default=20000)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--chunk-size", type=int, default=256)
+    p.set_defaults(func=bench_seg)
+
+    p = sub.add_parser("topk", help="穷举计分、MaxScore 剪枝与向量化计分的延迟对比（高频词查询）")
+    p.add_argument("--docs", type=int, default=50000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_topk)
+
+    p = sub.add_parser("phrase", help="短语查询与邻近度加分的延迟（多词查询）")
+    p.add_argument("--docs", type=int, default=50000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_phrase)
+
+    p = sub.add_parser("bool", help="布尔 AND 查询与词袋查询的延迟对比")
+    p.add_argument("--docs", type=int, default=50000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_bool)
+
+    p = sub.add_parser("shards", help="分片检索与单一索引的并发吞吐量对比")
+    p.add_argument("--docs", type=int, default=50000)
+    p.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--clients", type=int, default=8, help="并发提交查询的线程数")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_shards)
+
+    p = sub.add_parser("memory", help="dict 索引与紧凑索引 PackedIndex 的常驻内存对比")
+    p.add_argument("--docs", type=int, default=50000)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("stream", help="流式（SPIMI）构建与全量构建的输出对比和峰值内存")
+    p.add_argument("--docs", type=int, default=30000)
+    p.add_argument("--memory-mb", type=int, default=16)
+    p.add_argument("--format", choices=("json", "bin"), default="json")
+    p.set_defaults(func=bench_stream)
+
+    p = sub.add_parser("crawl", help="在本地测试站点 crawl_fixture/ 上核对爬虫的重试、断点续爬和增量抓取")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.set_defaults(func=bench_crawl)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
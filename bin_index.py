@@ -0,0 +1,239 @@
+# bin_index.py
+# -*- coding: utf-8 -*-
+
+"""
+倒排索引的紧凑二进制格式（re_idx.bin）
+
+文件布局（小端）：
+    头部        MAGIC(8B) | 词数 N(uint32) | 各段偏移(5 × uint64) | 文档数(uint64)
+    词串        按 UTF-8 字节序排序的全部词，顺序拼接
+    词偏移表    (N+1) × uint32，第 i 个词在词串中的起止位置
+    倒排偏移表  (N+1) × uint64，第 i 个词的倒排记录在倒排段中的起止位置
+    词分数      N × float64，每个词只存一次（仅出现在作者/关键词中的词为 NaN）
+    倒排段      每个词：文档数、差分文档号，再按 title/abstract/author/keyword
+                四个字段依次存每篇文档的位置个数和差分位置，全部为 varint
+
+查询时通过 mmap 打开，只解码查询词对应的倒排记录。头部的文档数用来核对索引是否由当前的 papers.json 构建；
+旧格式（IRSBIN01，头部没有文档数）仍可读取，doc_count 为 None。
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections.abc import Mapping
+
+MAGIC = b"IRSBIN02"
+MAGIC_V1 = b"IRSBIN01"
+FIELDS = ("title_positions", "abstract_positions", "author_positions", "keyword_positions")
+_HEADER = struct.Struct("<8sI6Q")
+_HEADER_V1 = struct.Struct("<8sI5Q")
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _put_deltas(out, values):
+    prev = 0
+    for v in values:
+        _put_varint(out, v - prev)
+        prev = v
+
+def _get_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def _get_deltas(buf, pos, count):
+    values = []
+    prev = 0
+    for _ in range(count):
+        d, pos = _get_varint(buf, pos)
+        prev += d
+        values.append(prev)
+    return values, pos
+
+def _term_score(postings):
+    """标题/摘要中出现时的分数对该词所有文档相同；仅作者/关键词命中的文档固定为1"""
+    for fields in postings.values():
+        if fields["title_positions"] or fields["abstract_positions"]:
+            return fields["score"]
+    return math.nan
+
+def _encode_postings(postings):
+    out = bytearray()
+    items = sorted((int(d), fields) for d, fields in postings.items())
+    _put_varint(out, len(items))
+    _put_deltas(out, [d for d, _ in items])
+    for name in FIELDS:
+        for _, fields in items:
+            poses = fields[name]
+            _put_varint(out, len(poses))
+            _put_deltas(out, poses)
+    return out
+
+def save_bin_index(inv, path, doc_count=None):
+    """
+    把 {词: {文档号: 字段}} 形式的索引写成二进制格式（写临时文件后替换，不影响已 mmap 的旧文件）；
+    doc_count 为建索引的文档总数，不给出时取最大文档号 + 1
+    """
+    terms = sorted(inv, key=lambda t: t.encode("utf-8"))
+    term_blob = bytearray()
+    term_offs = [0]
+    post_offs = [0]
+    scores = []
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        postings_off = _HEADER.size
+        max_doc_id = -1
+        for term in terms:
+            if inv[term]:
+                max_doc_id = max(max_doc_id, max(map(int, inv[term])))
+            data = _encode_postings(inv[term])
+            f.write(data)
+            post_offs.append(post_offs[-1] + len(data))
+            scores.append(_term_score(inv[term]))
+            term_blob += term.encode("utf-8")
+            term_offs.append(len(term_blob))
+
+        terms_off = f.tell()
+        f.write(term_blob)
+        term_offs_off = f.tell()
+        f.write(struct.pack(f"<{len(term_offs)}I", *term_offs))
+        post_offs_off = f.tell()
+        f.write(struct.pack(f"<{len(post_offs)}Q", *post_offs))
+        scores_off = f.tell()
+        f.write(struct.pack(f"<{len(scores)}d", *scores))
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, len(terms), terms_off, term_offs_off,
+                             post_offs_off, scores_off, postings_off,
+                             max_doc_id + 1 if doc_count is None else doc_count))
+    os.replace(tmp, path)
+
+class BinIndex(Mapping):
+    """mmap 打开的二进制索引，对外表现为只读的 {词: {文档号: 字段}} 字典"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self._mm[:len(MAGIC)]
+        if magic == MAGIC:
+            (_, self._n, self._terms_off, term_offs_off, post_offs_off,
+             scores_off, self._postings_off, self.doc_count) = _HEADER.unpack_from(self._mm, 0)
+        elif magic == MAGIC_V1:
+            (_, self._n, self._terms_off, term_offs_off, post_offs_off,
+             scores_off, self._postings_off) = _HEADER_V1.unpack_from(self._mm, 0)
+            self.doc_count = None
+        else:
+            raise ValueError(f"{path} 不是二进制索引文件")
+        n = self._n
+        self._term_offs = memoryview(self._mm)[term_offs_off:term_offs_off + 4 * (n + 1)].cast("I")
+        self._post_offs = memoryview(self._mm)[post_offs_off:post_offs_off + 8 * (n + 1)].cast("Q")
+        self._scores = memoryview(self._mm)[scores_off:scores_off + 8 * n].cast("d")
+
+    def close(self):
+        self._term_offs.release()
+        self._post_offs.release()
+        self._scores.release()
+        self._mm.close()
+        self._file.close()
+
+    def _term_bytes(self, i):
+        start = self._terms_off + self._term_offs[i]
+        end = self._terms_off + self._term_offs[i + 1]
+        return self._mm[start:end]
+
+    def _find(self, term):
+        """在排好序的词典中二分查找，返回词号，找不到返回 -1"""
+        key = term.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._term_bytes(lo) == key:
+            return lo
+        return -1
+
+    def _decode(self, i):
+        mm = self._mm
+        pos = self._postings_off + self._post_offs[i]
+        count, pos = _get_varint(mm, pos)
+        doc_ids, pos = _get_deltas(mm, pos, count)
+        columns = []
+        for _ in FIELDS:
+            column = []
+            for _ in range(count):
+                k, pos = _get_varint(mm, pos)
+                poses, pos = _get_deltas(mm, pos, k)
+                column.append(poses)
+            columns.append(column)
+        score = self._scores[i]
+        postings = {}
+        for j, doc_id in enumerate(doc_ids):
+            fields = {name: columns[f][j] for f, name in enumerate(FIELDS)}
+            fields["score"] = score if (fields["title_positions"] or fields["abstract_positions"]) else 1.0
+            postings[doc_id] = fields
+        return postings
+
+    def __getitem__(self, term):
+        i = self._find(term)
+        if i < 0:
+            raise KeyError(term)
+        return self._decode(i)
+
+    def __contains__(self, term):
+        return self._find(term) >= 0
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self._term_bytes(i).decode("utf-8")
+
+def json_to_bin(json_path, bin_path):
+    with open(json_path, encoding="utf-8") as f:
+        inv = json.load(f)
+    save_bin_index(inv, bin_path)
+
+def bin_to_json(bin_path, json_path):
+    index = BinIndex(bin_path)
+    try:
+        inv = {term: index[term] for term in index}
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(inv, f, ensure_ascii=False, indent=2)
+    finally:
+        index.close()
+
+def main():
+    # 格式转换：python bin_index.py re_idx.json re_idx.bin 或反过来
+    if len(sys.argv) != 3:
+        print("用法: python bin_index.py <输入索引> <输出索引>（按扩展名 .json/.bin 判断方向）")
+        sys.exit(1)
+    src, dst = sys.argv[1], sys.argv[2]
+    if src.endswith(".json") and dst.endswith(".bin"):
+        json_to_bin(src, dst)
+    elif src.endswith(".bin") and dst.endswith(".json"):
+        bin_to_json(src, dst)
+    else:
+        print("只支持 .json 与 .bin 之间互相转换")
+        sys.exit(1)
+    print(f"已转换 {src} -> {dst}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+# boolean_query.py
+# -*- coding: utf-8 -*-
+
+"""
+布尔与字段限定查询
+
+    信道估计 AND (OFDM OR MIMO) NOT 综述
+    author:张伟 keyword:深度学习 date:2018..2021
+    title:"信道 估计" abstract:卷积
+
+运算符 AND / OR / NOT 须大写，相邻两项之间默认为 AND，括号改变优先级（NOT > AND > OR）；
+查询中至少有一个运算符或字段前缀时才按布尔查询解析。
+字段前缀：title/abstract 限定在标题/摘要中出现（值先分词，每个词都须出现）；
+author/keyword 按完整的作者名/关键词匹配；date 为日期范围，如 2020、2019..2021、2019-03..、..2020-06，
+两端都含、按前缀比较。引号括起的部分为短语。
+
+解析结果是嵌套元组（可哈希，能作为缓存键、传给进程池）：
+    ("and", (子节点, ...))  ("or", (子节点, ...))  ("not", 子节点)
+    ("term", 位置键或 None, 词)  ("phrase", (位置键, ...), (词, ...))  ("date", 起, 止)
+位置键为 None 时该词出现在任一字段即可。
+
+求值时词的倒排记录转成升序文档号数组并建跳表指针。AND 的各项按估计大小从小到大求交：
+遍历当前结果（不超过最短的表），在较长的表中沿跳表指针整块跳过再块内二分；
+字段限定、短语和日期只对交集中剩下的文档逐个检查，工作量与最稀有的项成正比。
+"""
+
+import math
+import re
+from bisect import bisect_left
+
+from phrase import TEXT_FIELDS, has_phrase, phrase_docs, sorted_doc_ids
+
+FIELDS = {"title": "title_positions", "abstract": "abstract_positions",
+          "author": "author_positions", "keyword": "keyword_positions"}
+OPERATORS = ("AND", "OR", "NOT")
+
+LEXER = re.compile(r'\s*(?:(?P<paren>[()])|(?:(?P<field>title|abstract|author|keyword|date):)?'
+                   r'(?:"(?P<q1>[^"]*)"|“(?P<q2>[^”]*)”|(?P<word>[^\s()"“”]+)))')
+
+def tokenize(query):
+    """返回 [(类型, 值, 字段), ...]，类型为 ( ) AND OR NOT word quoted；不成对的引号忽略"""
+    tokens = []
+    for m in LEXER.finditer(query):
+        if m.group("paren"):
+            tokens.append((m.group("paren"), None, None))
+            continue
+        field = m.group("field")
+        word = m.group("word")
+        if word is not None:
+            if field is None and word in OPERATORS:
+                tokens.append((word, None, None))
+            else:
+                tokens.append(("word", word, field))
+        else:
+            text = m.group("q1") if m.group("q1") is not None else m.group("q2")
+            tokens.append(("quoted", text, field))
+    return tokens
+
+def is_boolean(tokens):
+    """
+    含运算符或字段前缀时按布尔查询处理，否则仍是原来的词袋查询。
+    只有括号不算：粘贴来的标题如 信道估计(OFDM) 不应变成要求每个词都出现的 AND 查询
+    """
+    return any(kind in OPERATORS or field for kind, _, field in tokens)
+
+def combine(op, parts):
+    flat = []
+    for part in parts:
+        if part is None:
+            continue
+        for p in (part[1] if part[0] == op else (part,)):
+            if p not in flat:
+                flat.append(p)
+    if not flat:
+        return None
+    return flat[0] if len(flat) == 1 else (op, tuple(flat))
+
+class _Parser:
+    """
+    递归下降：or := and (OR and)*；and := not ([AND] not)*；not := NOT not | atom；
+    atom := ( or ) | [字段:] 词或短语。多余的右括号和缺少操作数的运算符忽略，不报错。
+    解析的同时收集不在 NOT 之下的词、作者名和关键词，供计分使用。
+    """
+
+    def __init__(self, tokens, segment, term_dict):
+        self.tokens = tokens
+        self.pos = 0
+        self.segment = segment
+        self.term_dict = term_dict
+        self.negated = 0
+        self.words, self.authors, self.keywords = [], set(), set()
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        node = self.or_expr()
+        while self.pos < len(self.tokens):
+            self.pos += 1       # 跳过多余的右括号
+            node = combine("and", [node, self.or_expr()])
+        return node
+
+    def or_expr(self):
+        parts = [self.and_expr()]
+        while self.peek() == "OR":
+            self.pos += 1
+            parts.append(self.and_expr())
+        return combine("or", parts)
+
+    def and_expr(self):
+        parts = []
+        while self.peek() not in (None, ")", "OR"):
+            if self.peek() == "AND":
+                self.pos += 1
+                continue
+            parts.append(self.not_expr())
+        return combine("and", parts)
+
+    def not_expr(self):
+        if self.peek() != "NOT":
+            return self.atom()
+        self.pos += 1
+        self.negated += 1
+        child = self.not_expr()
+        self.negated -= 1
+        if child is None:
+            return None
+        return child[1] if child[0] == "not" else ("not", child)
+
+    def atom(self):
+        if self.peek() not in ("(", "word", "quoted"):
+            return None     # NOT 后面缺少操作数
+        kind, text, field = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "(":
+            node = self.or_expr()
+            if self.peek() == ")":
+                self.pos += 1
+            return node
+        return self.leaf(text, field, kind == "quoted")
+
+    def _collect(self, words=(), authors=(), keywords=()):
+        if self.negated % 2 == 0:
+            self.words.extend(words)
+            self.authors.update(authors)
+            self.keywords.update(keywords)
+
+    def leaf(self, text, field, quoted):
+        text = text.strip()
+        if not text:
+            return None
+        if field == "date":
+            lo, sep, hi = text.partition("..")
+            return ("date", lo.strip(), (hi if sep else lo).strip())
+        if field in ("author", "keyword"):
+            self._collect(authors=[text] if field == "author" else (),
+                          keywords=[text] if field == "keyword" else ())
+            return ("term", FIELDS[field], text)
+        words = tuple(self.segment(text))
+        keys = (FIELDS[field],) if field else TEXT_FIELDS
+        if field:
+            self._collect(words)
+        else:
+            # 不带前缀的词和原来一样识别其中的作者名/关键词
+            authors, keywords = self.term_dict.match(text)
+            self._collect(words, authors, keywords)
+        if quoted:
+            return ("phrase", keys, words) if words else None
+        node = combine("and", [("term", keys[0] if field else None, w) for w in words])
+        if not field and (text in authors or text in keywords):
+            # 整个词是作者名/关键词时按原词匹配也算命中（分词后的各词可能不全出现）
+            node = combine("or", [("term", None, text), node])
+        return node
+
+def parse(query, segment, term_dict):
+    """返回 (计分词列表, 作者集合, 关键词集合, 条件树)；查询为空时条件树为 None"""
+    parser = _Parser(tokenize(query), segment, term_dict)
+    node = parser.parse()
+    return parser.words, parser.authors, parser.keywords, node
+
+def node_terms(node):
+    """条件树中用到的全部词（批量查询预取倒排记录用）"""
+    if node is None:
+        return
+    kind = node[0]
+    if kind == "term":
+        yield node[2]
+    elif kind == "phrase":
+        yield from node[2]
+    elif kind == "not":
+        yield from node_terms(node[1])
+    elif kind in ("and", "or"):
+        for child in node[1]:
+            yield from node_terms(child)
+
+def _in_range(date, lo, hi):
+    return (not lo or date >= lo) and (not hi or date[:len(hi)] <= hi)
+
+class SkipList:
+    """升序文档号数组，每隔 step（约 √n）个元素设一个跳表指针"""
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.step = max(1, math.isqrt(len(ids)))
+        self.skips = ids[::self.step]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def seek(self, pos, x):
+        """从 pos 起第一个不小于 x 的位置：先沿跳表指针整块跳过，再在块内二分"""
+        j = pos // self.step + 1
+        while j < len(self.skips) and self.skips[j] <= x:
+            j += 1
+        return bisect_left(self.ids, x, max(pos, (j - 1) * self.step), min(j * self.step, len(self.ids)))
+
+    def intersect(self, other):
+        short, long = (self, other) if len(self) <= len(other) else (other, self)
+        result = []
+        pos, n = 0, len(long.ids)
+        for x in short.ids:
+            pos = long.seek(pos, x)
+            if pos == n:
+                break
+            if long.ids[pos] == x:
+                result.append(x)
+                pos += 1
+        return SkipList(result)
+
+    def difference(self, other):
+        result = []
+        pos, n = 0, len(other.ids)
+        for x in self.ids:
+            if pos < n:
+                pos = other.seek(pos, x)
+            if pos == n or other.ids[pos] != x:
+                result.append(x)
+        return SkipList(result)
+
+class Evaluator:
+    """
+    postings_of(词) 返回倒排记录；dates[文档号] 为日期字符串，已删除的文档为 None。
+    只有日期范围和不与其他项相交的 NOT 需要遍历全部文档，此时必须提供 dates。
+    """
+
+    def __init__(self, postings_of, dates=None):
+        self.postings_of = postings_of
+        self.dates = dates
+        self._lists = {}
+
+    def _n_docs(self):
+        if self.dates is None:
+            raise ValueError("日期范围和单独的 NOT 需要文档日期表")
+        return len(self.dates)
+
+    def universe(self):
+        self._n_docs()
+        return SkipList([d for d, date in enumerate(self.dates) if date is not None])
+
+    def estimate(self, node):
+        """结果大小的估计（上界），决定 AND 的求交顺序"""
+        kind = node[0]
+        if kind == "term":
+            return len(self.postings_of(node[2]))
+        if kind == "phrase":
+            return min(len(self.postings_of(w)) for w in node[2])
+        if kind == "or":
+            return sum(self.estimate(child) for child in node[1])
+        if kind == "and":
+            positives = [child for child in node[1] if child[0] != "not"]
+            if positives:
+                return min(self.estimate(child) for child in positives)
+        return self._n_docs()
+
+    def term_ids(self, term):
+        ids = self._lists.get(term)
+        if ids is None:
+            ids = self._lists[term] = SkipList(sorted_doc_ids(self.postings_of(term)))
+        return ids
+
+    def check(self, node):
+        """叶子节点对单个文档的判断，用于筛选交集中剩下的文档"""
+        kind = node[0]
+        if kind == "term":
+            _, field, term = node
+            postings = self.postings_of(term)
+            if field is None:
+                return postings.__contains__
+            return lambda d: d in postings and bool(postings[d][field])
+        if kind == "phrase":
+            postings_list = [self.postings_of(w) for w in node[2]]
+            return lambda d: has_phrase(postings_list, d, node[1])
+        _, lo, hi = node
+        self._n_docs()
+        return lambda d: self.dates[d] is not None and _in_range(self.dates[d], lo, hi)
+
+    def doc_ids(self, node):
+        kind = node[0]
+        if kind == "term":
+            _, field, term = node
+            ids = self.term_ids(term)
+            if field is None:
+                return ids
+            postings = self.postings_of(term)
+            return SkipList([d for d in ids.ids if postings[d][field]])
+        if kind == "phrase":
+            return SkipList(sorted(phrase_docs([self.postings_of(w) for w in node[2]], node[1])))
+        if kind == "date":
+            match = self.check(node)
+            return SkipList([d for d in range(self._n_docs()) if match(d)])
+        if kind == "not":
+            return self.universe().difference(self.doc_ids(node[1]))
+        if kind == "or":
+            return SkipList(sorted(set().union(*(self.doc_ids(child).ids for child in node[1]))))
+        return self._and(node[1])
+
+    def _and(self, children):
+        positives = sorted((c for c in children if c[0] != "not"), key=self.estimate)
+        negatives = [c[1] for c in children if c[0] == "not"]
+        result = self.doc_ids(positives[0]) if positives else self.universe()
+        checks = []
+        for child in positives[1:]:
+            if child[0] == "term":
+                # 先和该词的完整文档号表求交，字段限定留到最后逐个检查
+                result = result.intersect(self.term_ids(child[2]))
+                if child[1] is not None:
+                    checks.append(self.check(child))
+            elif child[0] in ("phrase", "date"):
+                checks.append(self.check(child))
+            else:
+                result = result.intersect(self.doc_ids(child))
+            if not result:
+                return result
+        rejects = []
+        for child in negatives:
+            if child[0] == "term" and child[1] is None:
+                result = result.difference(self.term_ids(child[2]))
+            elif child[0] in ("term", "phrase", "date"):
+                rejects.append(self.check(child))
+            else:
+                result = result.difference(self.doc_ids(child))
+        if checks or rejects:
+            result = SkipList([d for d in result.ids
+                               if all(c(d) for c in checks) and not any(r(d) for r in rejects)])
+        return result
+
+def evaluate(node, postings_of, dates=None):
+    """条件树 -> 满足条件的文档号（升序列表）"""
+    return Evaluator(postings_of, dates).doc_ids(node).ids
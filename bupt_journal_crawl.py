@@ -1,42 +1,183 @@
 # bupt_journal_crawl.py
+# -*- coding: utf-8 -*-
+
+"""
+北邮学报论文爬虫
+
+依次抓取年份页（得到各期目录页）、各期目录页（得到论文标题/作者/摘要/日期）和论文页（得到关键词），
+结果写入 papers.json。
+
+- 线程池并发下载，每个线程复用自己的 requests.Session（keep-alive）
+- 按主机限速，失败按指数退避重试，超过次数放弃该网页
+- 每下载解析完一个网页就往检查点文件追加一行，中断后重新运行会跳过已完成的网页
+- 检查点同时是网页清单：记录每个网页的 ETag/Last-Modified/内容哈希。
+  --refresh 模式用条件请求重新检查年份页和目录页，只解析新增或有变化的网页，
+  把新增/变化的论文写成增量文件，交给 create_rev_table.py --add/--delete 更新索引
+- --base-url 可指向本地测试服务器，年份页地址由它拼出，其余链接按页面中的相对/绝对地址解析
+
+用法：python bupt_journal_crawl.py [--years 1960 2025] [--concurrency 8] [--rate 5]
+      python bupt_journal_crawl.py --refresh
+      python create_rev_table.py --add papers_delta.json --delete papers_delta_deleted.txt
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
 
 import requests
 from lxml import etree
-from urllib.parse import urljoin
-import re
-import json
 
-journal_url_set = set()  # 使用set来存储唯一的URL
+from index_segments import write_json_atomic
 
-for year in range(1960,2026):
-    url = f'https://journal.bupt.edu.cn/CN/article/showTenYearVolumnDetail.do?nian={year}'
-    # print(url)
-    while True:
-        try:
-            response = requests.get(url=url, headers={'User-Agent': 'Mozilla/5.0'})
-            if response.status_code == 200:  # 确保请求成功
-                # print(f'成功下载网页{url}')
-                break
-            else:
-                print(f"下载网页失败，状态码：{response.status_code}")
-        except Exception as e:
-            print(f"下载网页时发生错误：{e}")
-            continue
-    # print(response.content)
-    html = etree.HTML(response.content)
+# ----------------- 配置区 -----------------
+BASE_URL = "https://journal.bupt.edu.cn"
+YEAR_PATH = "/CN/article/showTenYearVolumnDetail.do?nian={year}"
+FIRST_YEAR, LAST_YEAR = 1960, 2025
+OUTPUT_PATH = "papers.json"
+CHECKPOINT_PATH = "crawl_checkpoint.jsonl"
+DELTA_PATH = "papers_delta.json"
+DELETED_PATH = "papers_delta_deleted.txt"
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# 这一期目录页的第二篇论文结构特殊，单独解析
+SPECIAL_VOLUME = "/CN/volumn/volumn_1358.shtml"
+# ------------------------------------------
+
+class Fetcher:
+    """
+    带并发上限、按主机限速和指数退避重试的下载器
+
+    rate 为每个主机每秒最多发起的请求数；网络错误、429 和 5xx 会重试，
+    其余非200/304状态码直接放弃。重试 retries 次后仍失败返回 None。
+    """
 
-    # journal_lists = html.xpath('//div[@class="item-content"]/table/tr')[-1]
-    journal_urls = html.xpath('//a[@class="J_WenZhang"]/@href')
-    # print(len(journal_urls))
-    # 将新的URL添加到set中，set会自动去重
-    for journal_url in journal_urls:
-        journal_url = urljoin(url, journal_url)
-        journal_url_set.add(journal_url)
+    def __init__(self, concurrency=8, rate=5.0, retries=5, backoff=0.5, max_backoff=30.0, timeout=20):
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._next_time = {}
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            self._local.session = session
+        return session
+
+    def _wait_turn(self, url):
+        """同一主机的请求间隔不小于 interval"""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time.get(host, now))
+            self._next_time[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def request(self, url, headers=None):
+        """返回状态码为 200 或 304（条件请求未变化）的响应，失败返回 None"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+            self._wait_turn(url)
+            try:
+                response = self._session().get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                print(f"下载网页时发生错误：{url} {e}")
+                continue
+            if response.status_code in (200, 304):  # 确保请求成功
+                return response
+            print(f"下载网页失败，状态码：{response.status_code} {url}")
+            if response.status_code != 429 and response.status_code < 500:
+                return None
+        print(f"重试 {self.retries} 次后放弃：{url}")
+        return None
+
+    def fetch(self, url):
+        response = self.request(url)
+        return response.content if response is not None else None
+
+    def fetch_all(self, urls, validators=None):
+        """
+        并发下载，按完成顺序产出 (url, 响应)，失败的响应为 None；
+        validators(url) 返回条件请求头时发送条件请求
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.request, url, validators(url) if validators else None): url
+                       for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+class Checkpoint:
+    """
+    追加写的检查点文件（兼作网页清单），每行
+    {"kind": 页面类型, "url": 地址, "data": 解析结果, "etag": ..., "last_modified": ..., "sha1": 内容哈希}
+
+    只记录下载并解析成功的网页，同一地址以最后一行为准；最后一行可能因中断而不完整，读取时忽略。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {"year": {}, "volume": {}, "article": {}}
+        self.meta = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[entry["kind"]][entry["url"]] = entry["data"]
+                    self.meta[entry["url"]] = {key: entry.get(key) for key in ("etag", "last_modified", "sha1")}
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(self, kind, url, data, response=None):
+        meta = {"etag": None, "last_modified": None, "sha1": None}
+        if response is not None:
+            meta = {"etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "sha1": content_hash(response.content)}
+        line = json.dumps({"kind": kind, "url": url, "data": data, **meta}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.done[kind][url] = data
+            self.meta[url] = meta
+
+    def validators(self, url):
+        """条件请求头：服务器据此对未变化的网页返回 304"""
+        meta = self.meta.get(url) or {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def close(self):
+        self._file.close()
+
+def content_hash(content):
+    return hashlib.sha1(content).hexdigest()
 
 def process_authors(raw_authors):
     # 统一处理中英文逗号，分割作者
     authors = re.split(r'[，,;；]\s*', raw_authors)
-    
+
     cleaned_authors = []
     for author in authors:
         if len(author) > 5:
@@ -50,7 +191,7 @@ def process_authors(raw_authors):
             clean_author = re.sub(r'[^\u4e00-\u9fa5]', '', author)
             if clean_author:  # 过滤空字符串
                 cleaned_authors.append(clean_author)
-    
+
     # 合并单字与后一个元素
     merged_authors = []
     i = 0
@@ -73,7 +214,7 @@ class paper:
         self.abstract = abstract
         self.url = url
         self.date = date
-    
+
     def get_keyword(self, keyword):
         self.keyword = keyword
 
@@ -84,82 +225,195 @@ class paper:
             "date": self.date,
             "abstract": self.abstract,
             "keyword": self.keyword,
-            "url": self.url            
+            "url": self.url
         }
 
-origin_paper_list : list[paper] = []
-for journal_url in journal_url_set:
-    while True:
-        try:
-            response = requests.get(url=journal_url, headers={'User-Agent': 'Mozilla/5.0'})
-            if response.status_code == 200:  # 确保请求成功
-                # print(f'成功下载网页{journal_url}')
-                break
-            else:
-                print(f"下载网页失败，状态码：{response.status_code}")
-        except Exception as e:
-            print(f"下载网页时发生错误：{e}")
-            continue
-    html = etree.HTML(response.content.decode('utf-8', errors='ignore').replace('<M', '< M'))
+def clean_text(text):
+    return text.strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
+
+def parse_year_page(content, url):
+    """年份页 -> 各期目录页地址"""
+    html = etree.HTML(content)
+    if html is None:
+        return []
+    return [urljoin(url, href) for href in html.xpath('//a[@class="J_WenZhang"]/@href')]
+
+def parse_volume_page(content, volume_url):
+    """目录页 -> 该期论文（尚无关键词）；空网页抛出 ValueError，按解析失败计数，不写入检查点"""
+    html = etree.HTML(content.decode('utf-8', errors='ignore').replace('<M', '< M'))
+    if html is None:
+        raise ValueError("空网页")
     date = html.xpath('//span[@class="published"]/text()')[0].strip()[5:]
-    # print(date)
-    paper_blocks = html.xpath('//div[@class="current-content"]/ul[@class="lunwen"]')
-    a = 0
-    for paper_block in paper_blocks:
-        a += 1
-        if journal_url == 'https://journal.bupt.edu.cn/CN/volumn/volumn_1358.shtml' and a == 2:
+    special = urlparse(volume_url).path == SPECIAL_VOLUME
+    papers = []
+    for a, paper_block in enumerate(html.xpath('//div[@class="current-content"]/ul[@class="lunwen"]'), 1):
+        if special and a == 2:
             true_paper_block = paper_block.xpath('.//*[@class="biaoti"]')[0]
             title = true_paper_block.xpath('./a/text()')[0]
             url = true_paper_block.xpath('./a/@href')[0].strip()
-            # print(url)
-            authors = paper_block.xpath('.//*[@class="zuozhe"]/text()')[0].strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
+            authors = clean_text(paper_block.xpath('.//*[@class="zuozhe"]/text()')[0])
             author_list = process_authors(authors)
-            # print(','.join(author_list))
             abstract = paper_block.xpath('.//*[@class="zuozhe white_content"]/div/text()')[0]
-            origin_paper_list.append(paper(title, author_list, abstract, url, date))
         else:
             title_elements = paper_block.xpath('.//*[@class="biaoti"]//text()')
-            title = ''.join(title_elements).strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
+            title = clean_text(''.join(title_elements))
             title = re.sub(r'[\s\n\t\r]+', '', title)
-            authors = paper_block.xpath('.//*[@class="zuozhe"]/text()')[0].strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
+            authors = clean_text(paper_block.xpath('.//*[@class="zuozhe"]/text()')[0])
             if len(authors) == 0:
                 authors = paper_block.xpath('.//*[@class="zuozhe"]/div/text()')
-                if len(authors):
-                    authors = authors[0].strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
-                else: authors = ''
+                authors = clean_text(authors[0]) if len(authors) else ''
             author_list = process_authors(authors)
             abstract = paper_block.xpath('.//*[@class="zuozhe white_content"]//text()')
-            abstract = ''.join(abstract).strip().replace('\xa0', ' ').replace('\ue003', '').encode('gbk', errors='ignore').decode('gbk')
+            abstract = clean_text(''.join(abstract))
             abstract = re.sub(r'[\n\r\t]+', '', abstract)
-
             url = paper_block.xpath('.//*[@class="biaoti"]//a/@href')[0].strip()
-            origin_paper_list.append(paper(title, author_list, abstract, url, date))
+        papers.append(paper(title, author_list, abstract, urljoin(volume_url, url), date))
+    return papers
 
-paper_list : list[paper] = []
-for Paper in origin_paper_list:
-    while True:
+def parse_article_page(content):
+    """论文页 -> 关键词"""
+    html = etree.HTML(content)
+    keywords = html.xpath('//form[@name="refForm"]/p[1]/a/text()') if html is not None else []
+    return [re.sub(r'[\n\s\t\r,，；;(&nbsp)]+', '', keyword.strip()) for keyword in keywords]
+
+def _run_stage(fetcher, checkpoint, kind, urls, parse, refresh=False):
+    """
+    下载并解析检查点中还没有的网页；refresh=True 时对已有网页发条件请求重新检查。
+    返回 (失败的网页数, 新增或内容有变化的网页集合)
+    """
+    urls = list(dict.fromkeys(urls))
+    todo = urls if refresh else [url for url in urls if url not in checkpoint.done[kind]]
+    failed = 0
+    changed = set()
+    for url, response in fetcher.fetch_all(todo, checkpoint.validators if refresh else None):
+        if response is None:
+            failed += 1
+            continue
+        if response.status_code == 304:
+            continue
+        known = url in checkpoint.done[kind]
+        if known and (checkpoint.meta.get(url) or {}).get("sha1") == content_hash(response.content):
+            # 服务器不支持条件请求，但内容没变
+            continue
         try:
-            response = requests.get(url=Paper.url, headers={'User-Agent': 'Mozilla/5.0'})
-            if response.status_code == 200:  # 确保请求成功
-                # print(f'成功下载网页{Paper.url}')
-                # print(f'论文题目为{Paper.title}')
-                break
-            else:
-                print(f"下载网页失败，状态码：{response.status_code}")
-        except Exception as e:
-            print(f"下载网页时发生错误：{e}")
+            data = parse(response.content, url)
+        except (IndexError, ValueError) as e:
+            print(f"解析网页失败：{url} {e!r}")
+            failed += 1
             continue
-    html = etree.HTML(response.content)
-    keywords = html.xpath('//form[@name="refForm"]/p[1]/a/text()') if html is not None else []
-    keywords = [re.sub(r'[\n\s\t\r,，；;(&nbsp)]+','',keyword.strip()) for keyword in keywords]
-    # print(keywords)
-    Paper.get_keyword(keywords)
-    paper_list.append(Paper)
+        checkpoint.record(kind, url, data, response)
+        changed.add(url)
+    return failed, changed
 
-paper_dict_list = [paper.to_dict() for paper in paper_list]
+def _parse_volume(content, url):
+    return [p.__dict__ for p in parse_volume_page(content, url)]
 
-with open("papers.json", "w", encoding="utf-8") as f:
-    json.dump(paper_dict_list, f, ensure_ascii=False, indent=4)
+def _parse_article(content, url):
+    return parse_article_page(content)
+
+def crawl(fetcher, checkpoint, years, base_url=BASE_URL):
+    """抓取指定年份的全部论文，返回 (论文列表, 失败网页数)；论文按年份、期、期内顺序排列"""
+    done = checkpoint.done
+    year_urls = [urljoin(base_url, YEAR_PATH.format(year=year)) for year in years]
+    failed, _ = _run_stage(fetcher, checkpoint, "year", year_urls, parse_year_page)
+
+    volume_urls = [v for y in year_urls for v in done["year"].get(y, [])]
+    n, _ = _run_stage(fetcher, checkpoint, "volume", volume_urls, _parse_volume)
+    failed += n
+
+    volume_urls = list(dict.fromkeys(volume_urls))
+    papers = [paper(**p) for v in volume_urls for p in done["volume"].get(v, [])]
+    n, _ = _run_stage(fetcher, checkpoint, "article", [p.url for p in papers], _parse_article)
+    failed += n
+
+    paper_list = []
+    for Paper in papers:
+        if Paper.url in done["article"]:
+            Paper.get_keyword(done["article"][Paper.url])
+            paper_list.append(Paper)
+    return paper_list, failed
+
+def refresh(fetcher, checkpoint, years, base_url=BASE_URL):
+    """
+    增量抓取：对年份页和目录页发条件请求，只解析新增或有变化的网页。
+    返回 (新增/变化的论文, 需要先从索引中删除的 URL, 失败网页数)；
+    变化的论文既要删除旧版本又要加入新版本，目录页中消失的论文只删除。
+    """
+    done = checkpoint.done
+    # 已经写入过 papers.json 的论文（全量抓取只输出取到了关键词的论文）
+    indexed = set(done["article"])
+
+    year_urls = [urljoin(base_url, YEAR_PATH.format(year=year)) for year in years]
+    failed, _ = _run_stage(fetcher, checkpoint, "year", year_urls, parse_year_page, refresh=True)
+
+    volume_urls = list(dict.fromkeys(v for y in year_urls for v in done["year"].get(y, [])))
+    old_volumes = {v: done["volume"].get(v) or [] for v in volume_urls}
+    n, changed_volumes = _run_stage(fetcher, checkpoint, "volume", volume_urls, _parse_volume, refresh=True)
+    failed += n
+
+    # 变化的目录页中内容不同的论文，以及之前没取到关键词的论文，都要（重新）取论文页
+    candidates = set()
+    removed = set()
+    for v in changed_volumes:
+        old = {p["url"]: p for p in old_volumes[v]}
+        new = {p["url"]: p for p in done["volume"][v]}
+        candidates.update(url for url, p in new.items() if old.get(url) != p)
+        removed.update(url for url in old if url not in new)
+    papers = [paper(**p) for v in volume_urls for p in done["volume"].get(v, [])]
+    candidates.update(p.url for p in papers if p.url not in indexed)
+    article_urls = [p.url for p in papers if p.url in candidates]
+    n, changed_articles = _run_stage(fetcher, checkpoint, "article", article_urls, _parse_article, refresh=True)
+    failed += n
+
+    delta = []
+    for Paper in papers:
+        if Paper.url not in done["article"]:
+            continue
+        if Paper.url in candidates or Paper.url in changed_articles:
+            Paper.get_keyword(done["article"][Paper.url])
+            delta.append(Paper)
+    deleted = {p.url for p in delta if p.url in indexed} | (removed & indexed)
+    return delta, sorted(deleted), failed
+
+def main():
+    parser = argparse.ArgumentParser(description="北邮学报论文爬虫")
+    parser.add_argument("--years", type=int, nargs=2, default=(FIRST_YEAR, LAST_YEAR),
+                        metavar=("FIRST", "LAST"), help="抓取的年份范围（含两端）")
+    parser.add_argument("--base-url", default=BASE_URL, help="站点地址，可指向本地测试服务器")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="检查点文件，删除后从头抓取")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时下载的网页数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每个主机每秒最多请求数，0 为不限")
+    parser.add_argument("--retries", type=int, default=5, help="单个网页最多重试次数")
+    parser.add_argument("--refresh", action="store_true",
+                        help="增量抓取：只输出新增/变化的论文到 --delta，需删除的 URL 写到 --deleted")
+    parser.add_argument("--delta", default=DELTA_PATH)
+    parser.add_argument("--deleted", default=DELETED_PATH)
+    args = parser.parse_args()
+
+    fetcher = Fetcher(concurrency=args.concurrency, rate=args.rate, retries=args.retries)
+    checkpoint = Checkpoint(args.checkpoint)
+    years = range(args.years[0], args.years[1] + 1)
+    try:
+        if args.refresh:
+            delta, deleted, failed = refresh(fetcher, checkpoint, years, args.base_url)
+        else:
+            paper_list, failed = crawl(fetcher, checkpoint, years, args.base_url)
+    finally:
+        checkpoint.close()
 
-print(f"已存储 {len(paper_dict_list)} 篇论文到 papers.json")
+    if args.refresh:
+        write_json_atomic([paper.to_dict() for paper in delta], args.delta, indent=4)
+        with open(args.deleted, "w", encoding="utf-8") as f:
+            f.writelines(url + "\n" for url in deleted)
+        print(f"新增/变化 {len(delta)} 篇论文写入 {args.delta}，需删除 {len(deleted)} 个 URL 写入 {args.deleted}")
+        print(f"更新索引：python create_rev_table.py --add {args.delta} --delete {args.deleted}")
+    else:
+        paper_dict_list = [paper.to_dict() for paper in paper_list]
+        write_json_atomic(paper_dict_list, args.output, indent=4)
+        print(f"已存储 {len(paper_dict_list)} 篇论文到 {args.output}")
+    if failed:
+        print(f"{failed} 个网页下载或解析失败，重新运行会从检查点继续抓取")
 
+if __name__ == "__main__":
+    main()
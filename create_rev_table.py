@@ -4,13 +4,29 @@
 最终优化版：解决高频词误选问题
 """
 
+import argparse
 import json
+import os
 import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import chain
 import jieba
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 import math
+from term_dict import TermMatcher, add_to_term_dict, collect_terms, save_term_dict
+from term_expand import ExpansionBuilder, save_expansion_table
+from bin_index import FIELDS, BinIndex, save_bin_index
+from snippets import load_doc_tokens, save_doc_tokens
+from index_segments import (SEGMENT_DIR, STATS_PATH, has_updates, index_lock, load_segment,
+                            load_stats, save_stats, write_json_atomic)
+from index_shards import load_manifest, remove_shards, save_shards
+from packed_index import PackedIndex
+from startup_cache import (BIN_INDEX_PATH, DOC_TOKENS_PATH, DOCS_PATH, INDEX_PATH, TERM_DICT_PATH,
+                           TERM_EXPAND_PATH, init_jieba, save_snapshot, snapshot_key, snapshot_sources)
+import tracing
 
 import logging
 logging.getLogger("jieba").setLevel(logging.ERROR)
@@ -21,63 +37,172 @@ with open("cn_stopwords.txt", encoding="utf-8") as f:
         zh_stop.add(w.strip())
 
 def load_docs(path):
+    if path.endswith('.jsonl'):
+        return list(iter_docs(path))
     with open(path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+def iter_docs(path, buf_size=1 << 20):
+    """逐篇读取文档，不把整个文件读进内存：.jsonl 每行一篇，其余按 JSON 数组增量解析"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf = f.read(buf_size).lstrip()
+        if not buf.startswith('['):
+            raise ValueError(f"{path} 不是 JSON 数组")
+        pos = 1
+        eof = False
+        while True:
+            # 跳过空白和分隔的逗号
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ','):
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                if pos == len(buf):
+                    raise json.JSONDecodeError("需要更多数据", buf, pos)
+                doc, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # 当前对象跨越了缓冲区末尾，读入下一块后重试
+                more = f.read(buf_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield doc
+            pos = end
+
 def safe_segment(text):
     """安全分词：处理空字符串并过滤停用词"""
     if not text.strip():
         return []
     return [t for t in jieba.cut(text) if t.strip() and t not in zh_stop]
 
-def segment_fields(docs):
-    """处理各字段分词及位置记录，适应空字段和无效关键词"""
+def segment_with_lengths(text):
+    """同 safe_segment，另外返回过滤前每个词的长度（供查询时切分原文做高亮）"""
+    if not text.strip():
+        return [], []
+    raw = list(jieba.cut(text))
+    return [t for t in raw if t.strip() and t not in zh_stop], [len(t) for t in raw]
+
+def segment_doc(doc):
+    """单篇文档各字段分词及位置记录，适应空字段和无效关键词"""
+    # —— 标题处理（允许空标题）
+    title = doc.get("title", "")
+    title_tokens, title_lengths = segment_with_lengths(title)
+    tp = defaultdict(list)
+    for i, t in enumerate(title_tokens):
+        tp[t].append(i)
+
+    # —— 摘要处理（允许空摘要）
+    abstract = doc.get("abstract", "")
+    abs_tokens, abstract_lengths = segment_with_lengths(abstract)
+    ap = defaultdict(list)
+    for i, t in enumerate(abs_tokens):
+        ap[t].append(i)
+    corpus_text = " ".join(abs_tokens)  # 用于TF-IDF计算
+
+    # —— 作者处理（允许空列表，过滤无效作者名）
+    auth_map = defaultdict(list)
+    for i, name in enumerate(doc.get("author", [])):
+        name = name.strip()
+        if name and name not in zh_stop:
+            auth_map[name].append(i)
+
+    # —— 关键词处理（过滤"&nbsp"等无效值）
+    keyword_map = defaultdict(list)
+    for i, keyword in enumerate(doc.get("keyword", [])):
+        keyword = keyword.strip()
+        if keyword and keyword not in zh_stop and keyword != "&nbsp":
+            keyword_map[keyword].append(i)
+
+    return corpus_text, tp, ap, auth_map, keyword_map, [title_lengths, abstract_lengths]
+
+def _init_segment_worker():
+    """分词子进程初始化：停用词表随模块导入加载，jieba 词典在这里从缓存加载一次"""
+    init_jieba()
+
+def _segment_chunk(chunk):
+    return [segment_doc(doc) for doc in chunk]
+
+def segment_pool(workers):
+    """分词进程池，子进程各加载一次 jieba 词典；需要多次调用 segment_fields 时（流式构建）共用"""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_segment_worker)
+
+def segment_fields(docs, workers=1, chunk_size=256, pool=None):
+    """
+    处理各字段分词及位置记录，另返回每篇文档标题/摘要的分词词长
+
+    workers > 1 时按 chunk_size 篇一批分给进程池并行分词，传入 pool 时用这个进程池而不是新建，
+    结果按原文档顺序合并，与串行结果完全相同。
+    """
+    tracing.count("docs", len(docs))
+    if (pool is None and workers <= 1) or len(docs) <= chunk_size:
+        init_jieba()
+        results = map(segment_doc, docs)
+    else:
+        chunks = [docs[i:i + chunk_size] for i in range(0, len(docs), chunk_size)]
+        with nullcontext(pool) if pool is not None else segment_pool(workers) as pool:
+            # map 按提交顺序返回，合并后即为原文档顺序
+            results = [r for batch in pool.map(_segment_chunk, chunks) for r in batch]
+
     corpus_texts = []
     title_pos_list, abstract_pos_list, author_pos_list, keyword_pos_list = [], [], [], []
-
-    for doc in docs:
-        # —— 标题处理（允许空标题）
-        title = doc.get("title", "")
-        title_tokens = safe_segment(title)
-        tp = defaultdict(list)
-        for i, t in enumerate(title_tokens):
-            tp[t].append(i)
+    token_lengths = []
+    for corpus_text, tp, ap, auth_map, keyword_map, lengths in results:
+        corpus_texts.append(corpus_text)
         title_pos_list.append(tp)
-
-        # —— 摘要处理（允许空摘要）
-        abstract = doc.get("abstract", "")
-        abs_tokens = safe_segment(abstract)
-        ap = defaultdict(list)
-        for i, t in enumerate(abs_tokens):
-            ap[t].append(i)
         abstract_pos_list.append(ap)
-        corpus_texts.append(" ".join(abs_tokens))  # 用于TF-IDF计算
-
-        # —— 作者处理（允许空列表，过滤无效作者名）
-        auth_map = defaultdict(list)
-        for i, name in enumerate(doc.get("author", [])):
-            name = name.strip()
-            if name and name not in zh_stop:
-                auth_map[name].append(i)
         author_pos_list.append(auth_map)
-
-        # —— 关键词处理（过滤"&nbsp"等无效值）
-        keyword_map = defaultdict(list)
-        for i, keyword in enumerate(doc.get("keyword", [])):
-            keyword = keyword.strip()
-            if keyword and keyword not in zh_stop and keyword != "&nbsp":
-                keyword_map[keyword].append(i)
         keyword_pos_list.append(keyword_map)
+        token_lengths.append(lengths)
 
-    return corpus_texts, title_pos_list, abstract_pos_list, author_pos_list, keyword_pos_list
+    return corpus_texts, title_pos_list, abstract_pos_list, author_pos_list, keyword_pos_list, token_lengths
 
 def sigmoid(x):
     """sigmoid函数，将任意实数映射到(0,1)区间"""
     return 2 / (1 + math.exp(-x)) - 1
 
-def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
-    """构建倒排索引，适应空字段，并计算每个词的score"""
-    inv = defaultdict(dict)
+def _log1p_table(n):
+    """LOG[k] = log(1 + k)，k 为整数词频/文档长度，查表结果与逐个 math.log 逐位相同"""
+    return np.array([math.log(1 + k) for k in range(n + 1)])
+
+def _gather_counts(keys, entry_keys, entry_counts):
+    """在已排序的 (词, 文档) 键表中查出 keys 对应的计数，不存在的记为0"""
+    if not len(entry_keys):
+        return np.zeros(len(keys), dtype=np.int64)
+    idx = np.minimum(np.searchsorted(entry_keys, keys), len(entry_keys) - 1)
+    return np.where(entry_keys[idx] == keys, entry_counts[idx], 0)
+
+def _segment_sums(values, indptr):
+    """按段顺序累加（与逐项 += 的结果逐位相同），每一轮同时推进所有还没加完的段"""
+    lengths = np.diff(indptr)
+    order = np.argsort(-lengths, kind="stable")
+    starts = indptr[:-1][order]
+    lengths = lengths[order]
+    sums = np.zeros(len(lengths))
+    # lengths 已降序，第 k 轮参与累加的是前 active 个段
+    active_counts = np.searchsorted(-lengths, -np.arange(lengths[0] if len(lengths) else 0), side="left")
+    for k, active in enumerate(active_counts):
+        sums[:active] += values[starts[:active] + k]
+    result = np.empty_like(sums)
+    result[order] = sums
+    return result
+
+def term_statistics(title_list, abstract_list):
+    """
+    统计每个词的 df、sum_tf 以及各文档 TF 之和 doc_tf_sum
+
+    文档长度每篇只算一次；逐文档 TF 在词×文档稀疏计数矩阵上用 NumPy 整体计算。
+    返回 (词表, df, sum_tf, doc_tf_sum)，词表顺序为词首次出现的顺序。
+    """
     total_docs = len(title_list)
     
     # 计算每个词的文档频率(df) - 统计每个词在多少篇文档中出现过
@@ -85,76 +210,145 @@ def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
     # 计算每个词的总词频(sum_tf)
     sum_tf = defaultdict(int)
     
-    # 新增：计算语料库总词数
-    total_corpus_words = 0
+    # 每篇文档的标题/摘要长度只计算一次；同时记下稀疏矩阵的 (词号×N+文档号, 词频) 项
+    title_len, abstract_len = [], []
+    term_ids = {}
+    title_keys, title_counts = [], []
+    abstract_keys, abstract_counts = [], []
     
     for doc_id in range(total_docs):
-        # 统计标题中的词
-        for term, poses in title_list[doc_id].items():
-            df[term].add(doc_id)
-            sum_tf[term] += len(poses)
-            total_corpus_words += len(poses)  # 累加总词数
-        
-        # 统计摘要中的词
-        for term, poses in abstract_list[doc_id].items():
-            df[term].add(doc_id)
-            sum_tf[term] += len(poses)
-            total_corpus_words += len(poses)  # 累加总词数
-    
-    # 保存df的原始set形式，用于后续遍历
-    df_sets = {term: docs for term, docs in df.items()}
-    # 将df从set转换为文档数量
-    df = {term: len(docs) for term, docs in df.items()}
+        # 依次统计标题、摘要中的词
+        for pos_map, lengths, keys, counts in ((title_list[doc_id], title_len, title_keys, title_counts),
+                                               (abstract_list[doc_id], abstract_len, abstract_keys, abstract_counts)):
+            length = 0
+            for term, poses in pos_map.items():
+                n = len(poses)
+                df[term].add(doc_id)
+                sum_tf[term] += n
+                length += n
+                tid = term_ids.get(term)
+                if tid is None:
+                    tid = term_ids[term] = len(term_ids)
+                keys.append(tid * total_docs + doc_id)
+                counts.append(n)
+            lengths.append(length)
+    
+    # 语料库总词数
+    total_corpus_words = sum(title_len) + sum(abstract_len)
+    title_len = np.array(title_len, dtype=np.int64)
+    abstract_len = np.array(abstract_len, dtype=np.int64)
+    
+    terms = list(df)
+    if not terms:
+        return [], np.zeros(0, dtype=np.int64), [], np.zeros(0)
+    df_counts = np.array([len(df[term]) for term in terms], dtype=np.int64)
+    
+    # 词×文档稀疏矩阵（CSR）：每个词的列按 df 集合的遍历顺序排列，
+    # 保证后面逐词累加 doc_tf 的顺序与原实现一致
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(df_counts, out=indptr[1:])
+    cols = np.fromiter(chain.from_iterable(df[term] for term in terms),
+                       dtype=np.int64, count=int(indptr[-1]))
+    rows = np.repeat(np.arange(len(terms), dtype=np.int64), df_counts)
+    keys = rows * total_docs + cols
+    
+    def sorted_entries(entry_keys, entry_counts):
+        entry_keys = np.array(entry_keys, dtype=np.int64)
+        entry_counts = np.array(entry_counts, dtype=np.int64)
+        order = np.argsort(entry_keys)
+        return entry_keys[order], entry_counts[order]
+    
+    title_count = _gather_counts(keys, *sorted_entries(title_keys, title_counts))
+    abstract_count = _gather_counts(keys, *sorted_entries(abstract_keys, abstract_counts))
+    
+    # 该词出现在哪个字段，就把哪个字段的长度计入文档长度（与原实现相同）
+    term_count = title_count + abstract_count
+    doc_length = (np.where(title_count > 0, title_len[cols], 0)
+                  + np.where(abstract_count > 0, abstract_len[cols], 0))
+    log_table = _log1p_table(int(max(term_count.max(), doc_length.max())))
+    doc_tf = log_table[term_count] / log_table[doc_length]
+    doc_tf_sum = _segment_sums(doc_tf, indptr)
+    
+    return terms, df_counts, [sum_tf[term] for term in terms], doc_tf_sum
+
+def score_terms(total_docs, df_counts, doc_tf_sum):
+    """
+    由 df 和 doc_tf_sum 计算 TF、IDF、Raw_Score、Final_Score
+
+    log/exp 只按词（而不是按倒排记录）计算，使用 math 以保持与原实现逐位一致。
+    """
+    df_counts = np.asarray(df_counts, dtype=np.int64)
+    # 逐词：TF = log(1 + Σdoc_tf)，IDF = log(1 + N / (df + 1))
+    tf = np.array([math.log(1 + x) for x in np.asarray(doc_tf_sum, dtype=float).tolist()])
+    idf = np.array([math.log(1 + total_docs / (d + 1)) for d in df_counts.tolist()])
+    # 计算TF-IDF：log(1 + sqrt(tf) * idf³)
+    raw_score = [math.log(1 + x) for x in (np.sqrt(tf) * idf * idf * idf).tolist()]
+    # 使用sigmoid函数将分数映射到(0,1)区间，缩放因子3调整曲线陡峭程度
+    final_score = [sigmoid(x / 3) for x in raw_score]
+    return tf.tolist(), idf.tolist(), raw_score, final_score
+
+def compute_term_scores(title_list, abstract_list):
+    """计算每个词的 TF、IDF、Raw_Score、Final_Score，返回 [(词, tf, idf, raw_score, final_score), ...]"""
+    terms, df_counts, _, doc_tf_sum = term_statistics(title_list, abstract_list)
+    return list(zip(terms, *score_terms(len(title_list), df_counts, doc_tf_sum)))
+
+def doc_tf_contributions(tp, ap):
+    """单篇文档对各词 df/sum_tf/doc_tf_sum 的贡献，与 term_statistics 的算法相同"""
+    title_length = sum(len(poses) for poses in tp.values())
+    abstract_length = sum(len(poses) for poses in ap.values())
+    for term in dict.fromkeys(chain(tp, ap)):
+        term_count = 0
+        doc_length = 0
+        if term in tp:
+            term_count += len(tp[term])
+            doc_length += title_length
+        if term in ap:
+            term_count += len(ap[term])
+            doc_length += abstract_length
+        yield term, term_count, math.log(1 + term_count) / math.log(1 + doc_length)
+
+def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
+    """
+    构建倒排索引，适应空字段，并计算每个词的score
+
+    返回 (倒排索引, 词统计)，词统计为 {词: [df, sum_tf, doc_tf_sum, score]}，供增量更新使用
+    """
+    total_docs = len(title_list)
+    with tracing.span("term_statistics"):
+        terms, df_counts, sum_tf, doc_tf_sum = term_statistics(title_list, abstract_list)
+    with tracing.span("score_terms"):
+        tf, idf, raw_score, final_score = score_terms(total_docs, df_counts, doc_tf_sum)
     
     # 预计算每个词的score
-    term_scores = {}
+    term_scores = dict(zip(terms, final_score))
+    
+    with tracing.span("write_raw_scores"):
+        write_raw_scores(terms, tf, idf, raw_score, final_score)
     
+    with tracing.span("build_postings"):
+        inv = build_postings(title_list, abstract_list, author_list, keyword_list, term_scores)
+    tracing.count("terms", len(terms))
+    term_stats = {term: [int(d), n, float(x), score]
+                  for term, d, n, x, score in zip(terms, df_counts.tolist(), sum_tf, doc_tf_sum.tolist(), final_score)}
+    return inv, term_stats
+
+def write_raw_scores(terms, tf, idf, raw_score, final_score):
     # 打开文件准备写入
     with open('raw_scores.txt', 'w', encoding='utf-8') as f:
         f.write("词\tTF\tIDF\tRaw_Score\tFinal_Score\n")
-        for term in df:
-            # 计算IDF：log(1 + 总文档数 / (包含该词的文档数 + 1))
-            idf = math.log(1 + total_docs / (df[term] + 1))
-            
-            # 修正TF计算：对每篇文档分别计算TF后相加
-            doc_tf_sum = 0
-            for doc_id in df_sets[term]:  # 使用保存的set形式
-                # 计算该文档中该词的出现次数
-                term_count = 0
-                doc_length = 0
-                
-                # 统计标题中的词频
-                if term in title_list[doc_id]:
-                    term_count += len(title_list[doc_id][term])
-                    doc_length += sum(len(poses) for poses in title_list[doc_id].values())
-                
-                # 统计摘要中的词频
-                if term in abstract_list[doc_id]:
-                    term_count += len(abstract_list[doc_id][term])
-                    doc_length += sum(len(poses) for poses in abstract_list[doc_id].values())
-                
-                # 计算该文档中该词的TF值
-                if doc_length > 0:  # 避免除零错误
-                    doc_tf = math.log(1 + term_count) / math.log(1 + doc_length)
-                    doc_tf_sum += doc_tf
-            
-            tf = math.log(1 + doc_tf_sum)
-            
-            # 计算TF-IDF
-            raw_score = math.log(1 + math.sqrt(tf) * idf * idf * idf)
-            
-            # 使用sigmoid函数将分数映射到(0,1)区间
-            # 使用缩放因子3来调整sigmoid曲线的陡峭程度
-            final_score = sigmoid(raw_score / 3)
-            term_scores[term] = final_score
-            
+        for term, t, i, raw, final in zip(terms, tf, idf, raw_score, final_score):
             # 写入文件
-            f.write(f"{term}\t{tf:.6f}\t{idf:.6f}\t{raw_score:.6f}\t{final_score:.6f}\n")
+            f.write(f"{term}\t{t:.6f}\t{i:.6f}\t{raw:.6f}\t{final:.6f}\n")
+
+def build_postings(title_list, abstract_list, author_list, keyword_list, term_scores, first_doc_id=0):
+    """由各文档的位置表生成 {词: {文档号: 字段}}，文档号从 first_doc_id 开始"""
+    inv = defaultdict(dict)
     
     # 构建倒排索引
-    for doc_id in range(total_docs):
+    for i in range(len(title_list)):
+        doc_id = first_doc_id + i
         # 处理标题
-        for term, poses in title_list[doc_id].items():
+        for term, poses in title_list[i].items():
             inv[term].setdefault(doc_id, {
                 "title_positions": [], 
                 "abstract_positions": [],
@@ -164,7 +358,7 @@ def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
             })["title_positions"] = poses
             
         # 处理摘要
-        for term, poses in abstract_list[doc_id].items():
+        for term, poses in abstract_list[i].items():
             inv[term].setdefault(doc_id, {
                 "title_positions": [], 
                 "abstract_positions": [],
@@ -174,7 +368,7 @@ def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
             })["abstract_positions"] = poses
                 
         # 处理作者 - score固定为1
-        for term, poses in author_list[doc_id].items():
+        for term, poses in author_list[i].items():
             inv[term].setdefault(doc_id, {
                 "title_positions": [], 
                 "abstract_positions": [],
@@ -184,7 +378,7 @@ def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
             })["author_positions"] = poses
             
         # 处理关键词 - score固定为1
-        for term, poses in keyword_list[doc_id].items():
+        for term, poses in keyword_list[i].items():
             inv[term].setdefault(doc_id, {
                 "title_positions": [], 
                 "abstract_positions": [],
@@ -196,23 +390,255 @@ def build_inverted_index(title_list, abstract_list, author_list, keyword_list):
     return inv
 
 def save_index(inv, path):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(inv, f, ensure_ascii=False, indent=2)
+    write_json_atomic(inv, path, indent=2)
+
+def load_index(path):
+    with open(path, encoding='utf-8') as f:
+        inv = json.load(f)
+    return {term: {int(d): fields for d, fields in postings.items()}
+            for term, postings in inv.items()}
+
+def save_full_index(inv, term_stats, author_list, keyword_list, token_lengths, index_format, docs=None,
+                    shards=0):
+    """
+    写主索引、作者/关键词词典、查询扩展表、分词词长和统计文件，并删除已经并入主索引的增量段；
+    shards > 0 时另外按文档号切成这么多个分片（见 index_shards.py）；
+    docs 为 papers.json 中的文档时顺带生成 query.py 的启动快照
+    """
+    with tracing.span("save_index"):
+        if index_format == "bin":
+            save_bin_index(inv, BIN_INDEX_PATH, len(token_lengths))
+        else:
+            save_index(inv, INDEX_PATH)
+
+    with tracing.span("save_aux_files"):
+        authors, keywords = collect_terms(author_list, keyword_list)
+        save_term_dict(authors, keywords, TERM_DICT_PATH)
+        expansion = ExpansionBuilder()
+        expansion.add_docs(author_list, keyword_list)
+        save_expansion_table(expansion.build(term_stats), TERM_EXPAND_PATH)
+        save_doc_tokens(token_lengths, DOC_TOKENS_PATH)
+        save_index_stats(term_stats, len(token_lengths), index_format)
+    if shards > 0:
+        with tracing.span("save_shards"):
+            save_shards(inv, len(token_lengths), shards, index_format)
+    if docs is not None:
+        with tracing.span("save_snapshot"):
+            key = snapshot_key(index_format, snapshot_sources(index_format))
+            save_snapshot(key, docs, PackedIndex(inv) if index_format == "json" else None,
+                          token_lengths, TermMatcher(authors, keywords))
+
+def save_index_stats(term_stats, total_docs, index_format):
+    """全量构建后重写统计文件，并删除已经并入主索引的增量段和按旧索引切出的分片"""
+    remove_shards()
+    old_stats = load_stats(STATS_PATH)
+    save_stats({"format": index_format, "total_docs": total_docs,
+                "deleted": [], "segments": [], "terms": term_stats}, STATS_PATH)
+    for path in (old_stats or {}).get("segments", []):
+        if os.path.exists(path):
+            os.remove(path)
+
+def update_index(add_path=None, delete_path=None, workers=1):
+    """
+    增量更新：只对新增/删除的文档分词
+
+    删除按 URL 标记（文档号不变），新增文档连同倒排记录写成一个增量段；
+    统计文件中每个词的 df/sum_tf/doc_tf_sum 按这些文档的贡献增减，
+    再用新的文档总数重算所有词的分数（文档数变化后每个词的 IDF 都会变）。
+    整个过程持有索引写锁，与压缩、其他增量更新互斥。
+    """
+    with index_lock():
+        _update_index(add_path, delete_path, workers)
+
+def _update_index(add_path, delete_path, workers):
+    stats = load_stats(STATS_PATH)
+    if stats is None:
+        raise SystemExit(f"没有找到 {STATS_PATH}，请先全量构建索引")
+    terms = stats["terms"]
+    deleted = set(stats["deleted"])
+    total_docs = stats["total_docs"]
+
+    def apply(title_list, abstract_list, sign):
+        for tp, ap in zip(title_list, abstract_list):
+            for term, term_count, doc_tf in doc_tf_contributions(tp, ap):
+                row = terms.setdefault(term, [0, 0, 0.0, 0.0])
+                row[0] += sign
+                row[1] += sign * term_count
+                row[2] += sign * doc_tf
+
+    if delete_path:
+        with open(delete_path, encoding='utf-8') as f:
+            urls = {line.strip() for line in f if line.strip()}
+        docs = load_docs(DOCS_PATH)
+        for path in stats["segments"]:
+            docs.extend(load_segment(path)["docs"])
+        del_ids = [i for i, doc in enumerate(docs) if i not in deleted and doc.get("url") in urls]
+        print(f"删除 {len(del_ids)} 篇文档...")
+        with tracing.span("segment_fields"):
+            _, tpos, apos, _, _, _ = segment_fields([docs[i] for i in del_ids], workers=workers)
+        apply(tpos, apos, -1)
+        deleted.update(del_ids)
+
+    new_docs = load_docs(add_path) if add_path else []
+    if new_docs:
+        print(f"新增 {len(new_docs)} 篇文档...")
+        with tracing.span("segment_fields"):
+            _, tpos, apos, upos, kpos, token_lengths = segment_fields(new_docs, workers=workers)
+        apply(tpos, apos, 1)
+
+    # 用当前文档总数重算所有词的分数，df 降为0的词不再保留
+    terms = {term: row for term, row in terms.items() if row[0] > 0}
+    _, _, _, final_score = score_terms(total_docs + len(new_docs) - len(deleted),
+                                       [row[0] for row in terms.values()],
+                                       [row[2] for row in terms.values()])
+    for row, score in zip(terms.values(), final_score):
+        row[3] = score
+
+    if new_docs:
+        with tracing.span("build_postings"):
+            inv = build_postings(tpos, apos, upos, kpos, {term: row[3] for term, row in terms.items()},
+                                 first_doc_id=total_docs)
+        os.makedirs(SEGMENT_DIR, exist_ok=True)
+        seg_path = os.path.join(SEGMENT_DIR, f"seg_{total_docs:08d}.json")
+        with tracing.span("save_segment"):
+            write_json_atomic({"first_doc_id": total_docs, "docs": new_docs, "postings": inv,
+                               "tokens": token_lengths}, seg_path)
+        stats["segments"].append(seg_path)
+        add_to_term_dict(*collect_terms(upos, kpos), TERM_DICT_PATH)
+
+    stats.update(total_docs=total_docs + len(new_docs), deleted=sorted(deleted), terms=terms)
+    save_stats(stats, STATS_PATH)
+
+def compact_index(wait=True):
+    """
+    把增量段和删除标记并回主索引
+
+    由合并后的倒排记录还原各文档的位置表（不再分词），去掉已删除文档并重新编号，
+    然后与全量构建一样重算分数并写出索引、papers.json 和统计文件；原来切过分片的按原分片数重新切分。
+    整个过程持有索引写锁；wait=False 时若另一个进程正在更新或压缩，直接返回 False。
+    """
+    with index_lock(blocking=wait) as locked:
+        return locked and _compact_index()
+
+def _compact_index():
+    stats = load_stats(STATS_PATH)
+    if not has_updates(stats):
+        return False
+    manifest = load_manifest()
+    shards = len(manifest["shards"]) if manifest else 0
+    index_format = stats["format"]
+    base = BinIndex(BIN_INDEX_PATH) if index_format == "bin" else load_index(INDEX_PATH)
+    segments = [load_segment(path) for path in stats["segments"]]
+    docs = load_docs(DOCS_PATH)
+    if os.path.exists(DOC_TOKENS_PATH):
+        token_lengths = load_doc_tokens(DOC_TOKENS_PATH)
+    else:
+        # 旧索引没有分词词长文件，只能补一次分词
+        token_lengths = [segment_doc(doc)[5] for doc in docs]
+    for seg in segments:
+        docs.extend(seg["docs"])
+        token_lengths.extend(seg["tokens"])
+
+    deleted = set(stats["deleted"])
+    live = [i for i in range(len(docs)) if i not in deleted]
+    new_id = {old: new for new, old in enumerate(live)}
+    field_maps = {name: [{} for _ in live] for name in FIELDS}
+    for source in [base] + [seg["postings"] for seg in segments]:
+        for term in source:
+            for doc_id, fields in source[term].items():
+                if doc_id not in new_id:
+                    continue
+                for name in FIELDS:
+                    if fields[name]:
+                        field_maps[name][new_id[doc_id]][term] = fields[name]
+    if index_format == "bin":
+        base.close()
+
+    # 位置表的键序就是词在该字段中首次出现的顺序
+    tpos, apos, upos, kpos = ([dict(sorted(m.items(), key=lambda item: item[1][0])) for m in field_maps[name]]
+                              for name in FIELDS)
+    inv, term_stats = build_inverted_index(tpos, apos, upos, kpos)
+
+    current = load_stats(STATS_PATH)
+    if (current["segments"], current["deleted"]) != (stats["segments"], stats["deleted"]):
+        # 不经过写锁改动了统计文件（如旧版本的更新程序），放弃本次结果
+        return False
+    docs = [docs[i] for i in live]
+    write_json_atomic(docs, DOCS_PATH, indent=4)
+    save_full_index(inv, term_stats, upos, kpos, [token_lengths[i] for i in live], index_format, docs,
+                    shards)
+    return True
 
 def main():
-    json_in, json_out = 'papers.json', 're_idx.json'
+    parser = argparse.ArgumentParser(description="构建倒排索引")
+    parser.add_argument("--format", choices=("json", "bin"), default="json",
+                        help="索引文件格式：json 写 re_idx.json，bin 写 re_idx.bin")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="分词进程数，默认1（串行）")
+    parser.add_argument("--add", metavar="JSON",
+                        help="增量模式：把该文件中的论文加入索引（格式同 papers.json）")
+    parser.add_argument("--delete", metavar="TXT",
+                        help="增量模式：从索引中删除该文件中列出的 URL（每行一个）")
+    parser.add_argument("--compact", action="store_true",
+                        help="把增量段并回主索引")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式构建：分批写临时文件再归并，内存占用不随语料规模增长")
+    parser.add_argument("--memory-mb", type=int, default=512,
+                        help="流式构建时每批文档的内存预算（MB）")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="全量构建时另外按文档号切成 N 个分片，供 query.py/server.py --shards 多进程并行检索")
+    parser.add_argument("--docs", default=DOCS_PATH,
+                        help="全量构建读取的文档文件（JSON 数组或 .jsonl）")
+    parser.add_argument("--trace", nargs="?", const="", metavar="JSONL",
+                        help="记录各阶段耗时和文档/词数，结束时打印汇总；给出文件名时追加一行 JSON")
+    args = parser.parse_args()
+    if args.shards and (args.add or args.delete or args.compact or args.stream):
+        parser.error("--shards 只用于普通的全量构建（压缩时按原分片数重新切分）")
+
+    if args.trace is not None:
+        tracing.enable(args.trace or None)
+    mode = ("update" if args.add or args.delete else "compact" if args.compact
+            else "stream" if args.stream else "full")
+    with tracing.record("build", mode=mode, format=args.format):
+        run(args)
+    if args.trace is not None:
+        print(tracing.summary())
+
+def run(args):
+    if args.add or args.delete:
+        update_index(args.add, args.delete, workers=args.workers)
+        print("完成！")
+        return
+    if args.compact:
+        print("压缩索引...")
+        print("完成！" if compact_index() else "没有需要压缩的增量段")
+        return
+
+    if args.stream:
+        from stream_build import build_streaming
+        print("流式构建索引...")
+        with index_lock():
+            n = build_streaming(args.docs, args.format, memory_mb=args.memory_mb, workers=args.workers)
+        print(f"完成！共 {n} 篇文档")
+        return
+
     print("加载文档...")
-    docs = load_docs(json_in)
+    with tracing.span("load_docs"):
+        docs = load_docs(args.docs)
     
     print("处理字段分词...")
-    corpus, tpos, apos, upos, kpos = segment_fields(docs)
+    with tracing.span("segment_fields"):
+        corpus, tpos, apos, upos, kpos, token_lengths = segment_fields(docs, workers=args.workers)
     
     print("构建倒排索引...")
-    inv = build_inverted_index(tpos, apos, upos, kpos)
+    inv, term_stats = build_inverted_index(tpos, apos, upos, kpos)
     
     print("保存索引文件...")
-    save_index(inv, json_out)
+    # 从其他文件构建时 papers.json 不对应这些文档，不生成启动快照
+    with index_lock():
+        save_full_index(inv, term_stats, upos, kpos, token_lengths, args.format,
+                        docs if args.docs == DOCS_PATH else None, args.shards)
     print("完成！")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
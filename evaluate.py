@@ -0,0 +1,225 @@
+# evaluate.py
+# -*- coding: utf-8 -*-
+
+"""
+检索效果与性能评测：用已有的评价日志和人工标注对比不同计分配置
+
+    python evaluate.py [--judgments judgments.jsonl] [--configs configs.json] [--build] [-o eval_results.json]
+
+查询集与相关性判断来自：
+  * feedback.log（或 --feedback 指定的 JSONL 格式评价日志 feedback.jsonl）：每条评价的搜索词和当时展示的结果
+    （按 URL 识别文档，重建索引后仍然有效）。
+    展示过的结果默认相关（等级1）；评价中点名无关的名次（如“第2346都和RFID无关”“10 不相关”）记为0；
+  * --judgments 指定的 JSONL：每行 {"query": 查询串, "judgments": {URL: 等级}}，
+    或 {"query": 查询串, "relevant": [URL, ...]}（等级记为1）。同一查询的判断会合并，后读入的覆盖先读入的。
+
+每个配置对全部查询各运行 --repeat 次（不使用结果缓存），报告 P@k、nDCG@k 和延迟的 p50/p95/p99；
+另报告加载索引耗时、进程峰值内存，加 --build 时在临时目录中重建一次索引并报告构建耗时和峰值内存。
+结果写入 JSON 文件，数值统一取固定位数，方便和上一次的结果 diff。
+
+配置文件为 JSON 数组，每项形如
+    {"name": "作者权重减半", "weights": {"AUTHOR_WEIGHT": 25.0}, "proximity": false, "exhaustive": false}
+weights 覆盖 query.py 配置区中的同名常量，不给出 --configs 时对比默认配置和邻近度加分。
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import resource
+import shutil
+import tempfile
+import time
+
+import query
+from feedback_log import read_feedback_jsonl
+
+FEEDBACK_SEPARATOR = "-" * 50
+NEGATIVE_WORDS = ("无关", "不相关", "不对", "错误")
+DEFAULT_CONFIGS = [{"name": "默认"}, {"name": "邻近度加分", "proximity": True}]
+RESULTS_PATH = "eval_results.json"
+
+def parse_feedback_log(path):
+    """返回 [{"query", "urls", "feedback"}, ...]，urls 为当时展示的结果按名次排列"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    entries = []
+    for block in text.split(FEEDBACK_SEPARATOR):
+        m = re.search(r"^搜索词: (.*)$", block, re.M)
+        if not m:
+            continue
+        urls = re.findall(r"^\s*URL: (.*)$", block, re.M)
+        _, _, feedback = block.partition("用户评价：")
+        entries.append({"query": m.group(1).strip(), "urls": [u.strip() for u in urls],
+                        "feedback": feedback.strip()})
+    return entries
+
+def parse_feedback_jsonl(path):
+    """JSONL 格式的评价日志，返回值与 parse_feedback_log 相同"""
+    return [{"query": r["query"].strip(), "urls": [x.get("url", "") for x in r["results"]],
+             "feedback": r["feedback"].strip()} for r in read_feedback_jsonl(path)]
+
+def mentioned_ranks(text, n):
+    """评价中提到的名次：不超过 n 的数字按一个名次，否则按单个数字拆开（“2346” -> 2、3、4、6）"""
+    ranks = set()
+    for num in re.findall(r"\d+", text):
+        if 1 <= int(num) <= n:
+            ranks.add(int(num))
+        else:
+            ranks.update(int(c) for c in num if 1 <= int(c) <= n)
+    return ranks
+
+def feedback_judgments(entry):
+    grades = {url: 1 for url in entry["urls"] if url}
+    if any(word in entry["feedback"] for word in NEGATIVE_WORDS):
+        for rank in mentioned_ranks(entry["feedback"], len(entry["urls"])):
+            url = entry["urls"][rank - 1]
+            if url:
+                grades[url] = 0
+    return grades
+
+def read_judgments(path):
+    """JSONL 标注文件 -> [(查询串, {URL: 等级}), ...]"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            obj = json.loads(line)
+            q = str(obj.get("query", obj.get("q", ""))).strip()
+            grades = {url: int(g) for url, g in obj.get("judgments", {}).items()}
+            grades.update((url, 1) for url in obj.get("relevant", ()))
+            if q and grades:
+                items.append((q, grades))
+    return items
+
+def load_query_set(feedback_path=None, judgments_path=None):
+    """合并两种来源，返回 {查询串: {URL: 等级}}，按首次出现的顺序"""
+    query_set = {}
+    sources = []
+    if feedback_path and os.path.exists(feedback_path):
+        parse = parse_feedback_jsonl if feedback_path.endswith(".jsonl") else parse_feedback_log
+        sources += [(e["query"], feedback_judgments(e)) for e in parse(feedback_path)]
+    if judgments_path:
+        sources += read_judgments(judgments_path)
+    for q, grades in sources:
+        query_set.setdefault(q, {}).update(grades)
+    return query_set
+
+def precision_at_k(urls, grades, k):
+    return sum(1 for url in urls[:k] if grades.get(url, 0) > 0) / k
+
+def ndcg_at_k(urls, grades, k):
+    """等级 g 的增益为 2^g - 1；没有相关文档的查询返回 None，不计入平均"""
+    ideal = sorted(grades.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    if idcg == 0:
+        return None
+    dcg = sum((2 ** grades.get(url, 0) - 1) / math.log2(i + 2) for i, url in enumerate(urls[:k]))
+    return dcg / idcg
+
+def percentile(sorted_values, p):
+    """最近秩法"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else 0.0
+
+def run_config(state, query_set, config, k, repeat):
+    docs, inv, term_dict, highlighter = state
+    saved = {name: getattr(query, name) for name in config.get("weights", {})}
+    for name, value in config.get("weights", {}).items():
+        setattr(query, name, value)
+    try:
+        latencies, per_query = [], []
+        for q, grades in query_set.items():
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                results = query.search(docs, inv, term_dict, highlighter, q, k=k,
+                                       exhaustive=config.get("exhaustive", False),
+                                       proximity=config.get("proximity", False))
+                latencies.append(time.perf_counter() - t0)
+            urls = [r["url"] for r in results]
+            ndcg = ndcg_at_k(urls, grades, k)
+            per_query.append({"query": q, "p_at_k": round(precision_at_k(urls, grades, k), 4),
+                              "ndcg_at_k": None if ndcg is None else round(ndcg, 4)})
+    finally:
+        for name, value in saved.items():
+            setattr(query, name, value)
+    latencies.sort()
+    return {
+        "name": config["name"],
+        "config": {key: value for key, value in config.items() if key != "name"},
+        "p_at_k": round(_mean(r["p_at_k"] for r in per_query), 4),
+        "ndcg_at_k": round(_mean(r["ndcg_at_k"] for r in per_query), 4),
+        "latency_ms": {"p50": round(percentile(latencies, 50) * 1000, 3),
+                       "p95": round(percentile(latencies, 95) * 1000, 3),
+                       "p99": round(percentile(latencies, 99) * 1000, 3),
+                       "mean": round(_mean(latencies) * 1000, 3)},
+        "queries": per_query,
+    }
+
+def measure_build(index_format):
+    """在临时目录中用当前的 papers.json 全量构建一次，返回 (耗时秒, 峰值内存 MB)"""
+    from bench import _run_build
+    work = tempfile.mkdtemp(prefix="eval_build_")
+    try:
+        for name in (query.DOCS_PATH, "cn_stopwords.txt"):
+            shutil.copy(name, work)
+        return _run_build(work, ["--format", index_format])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="检索效果与延迟评测")
+    parser.add_argument("--feedback", default=query.LOG_PATH, help="评价日志")
+    parser.add_argument("--judgments", help="JSONL 标注文件")
+    parser.add_argument("--configs", help="JSON 配置列表，默认对比默认配置和邻近度加分")
+    parser.add_argument("--format", choices=("json", "bin"), default="json",
+                        help="索引文件格式：json 读 re_idx.json，bin 读 re_idx.bin")
+    parser.add_argument("--k", type=int, default=query.TOPK)
+    parser.add_argument("--repeat", type=int, default=3, help="每个查询运行次数（延迟统计用）")
+    parser.add_argument("--build", action="store_true", help="另外测量一次全量构建的耗时和峰值内存")
+    parser.add_argument("-o", "--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    query_set = load_query_set(args.feedback, args.judgments)
+    if not query_set:
+        print("没有可用的查询：评价日志和标注文件都为空")
+        return
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            configs = json.load(f)
+
+    t0 = time.perf_counter()
+    state = query.load_data(args.format)
+    query.init_jieba()
+    load_time = time.perf_counter() - t0
+
+    report = {"k": args.k, "repeat": args.repeat, "format": args.format,
+              "query_count": len(query_set), "load_s": round(load_time, 3), "configs": []}
+    for config in configs:
+        result = run_config(state, query_set, config, args.k, args.repeat)
+        report["configs"].append(result)
+        lat = result["latency_ms"]
+        print(f"{result['name']}: P@{args.k} {result['p_at_k']:.4f}  nDCG@{args.k} {result['ndcg_at_k']:.4f}  "
+              f"p50 {lat['p50']:.2f}ms  p95 {lat['p95']:.2f}ms  p99 {lat['p99']:.2f}ms")
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    if args.build:
+        elapsed, rss = measure_build(args.format)
+        report["build"] = {"seconds": round(elapsed, 2), "peak_rss_mb": round(rss, 1)}
+        print(f"全量构建: {elapsed:.1f}s  峰值内存 {rss:.0f}MB")
+    print(f"{len(query_set)} 个查询，加载 {load_time:.2f}s，峰值内存 {report['peak_rss_mb']:.0f}MB")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"结果已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
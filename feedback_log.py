@@ -0,0 +1,105 @@
+# feedback_log.py
+# -*- coding: utf-8 -*-
+
+"""
+评价日志：后台线程批量追加，不阻塞查询和交互提示
+
+    writer = FeedbackWriter("feedback.log", "feedback.jsonl")
+    writer.submit(查询串, 结果列表, 评价)      # 立即返回，只记下时间并放进队列
+    writer.close()                            # 写完队列中剩余的记录后关闭（进程退出时也会自动调用）
+
+每条评价同时写两份：feedback.log 为原来的文本格式（evaluate.py 照常解析），
+feedback.jsonl 每行一条 {"time", "query", "results", "feedback"}，results 与 query.search 的返回值相同，
+便于之后批量分析。写线程每次取出队列中积压的全部记录，格式化后一次写入并 flush。
+"""
+
+import atexit
+import datetime
+import json
+import queue
+import threading
+
+SEPARATOR = "-" * 50
+_CLOSE = object()
+
+def format_feedback(last_query, last_results, feedback, timestamp=None):
+    """构建一条文本格式的评价日志；timestamp 为 None 时取当前时间"""
+    log_content = []
+    timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    log_content.append(f"[评价时间] {timestamp}")
+    log_content.append(f"搜索词: {last_query}")
+
+    if last_results:
+        log_content.append(f"\nTop{len(last_results)} 搜索结果：")
+        for idx, r in enumerate(last_results, 1):
+            log_content.append(f"{idx}. 相关度: {r['score']:.2f}\n")
+            log_content.append(f"   标题: {r['title']}\n")
+            log_content.append(f"   作者: {' '.join(r['author'])}\n")
+            log_content.append(f"   摘要: {r['snippet']}\n")
+            log_content.append(f"   关键词: {' '.join(r['keyword'])}\n")
+            log_content.append(f"   URL: {r['url']}\n")
+            log_content.append(f"   日期: {r['date']}\n\n")
+    else:
+        log_content.append("未找到相关内容。")
+
+    log_content.append(f"用户评价：\n{feedback}")
+    log_content.append(SEPARATOR)
+
+    return "\n".join(log_content)
+
+def read_feedback_jsonl(path):
+    """读取 JSONL 格式的评价日志，返回 [{"time", "query", "results", "feedback"}, ...]"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class FeedbackWriter:
+    """多个线程可以同时 submit；jsonl_path 为 None 时只写文本格式"""
+
+    def __init__(self, text_path, jsonl_path=None):
+        self.text_path = text_path
+        self.jsonl_path = jsonl_path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, last_query, last_results, feedback):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        item = (timestamp, last_query, last_results, feedback)
+        if self._thread.is_alive():
+            self._queue.put(item)
+        else:
+            # 已经 close，直接写
+            self._write([item])
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _CLOSE in batch:
+                closing = True
+                batch = [item for item in batch if item is not _CLOSE]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        with open(self.text_path, "a", encoding="utf-8") as f:
+            f.writelines(format_feedback(q, results, feedback, timestamp) + "\n"
+                         for timestamp, q, results, feedback in batch)
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps({"time": timestamp, "query": q, "results": results,
+                                         "feedback": feedback}, ensure_ascii=False) + "\n"
+                             for timestamp, q, results, feedback in batch)
+
+    def close(self):
+        """写完已提交的记录后停止写线程；重复调用无影响"""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        atexit.unregister(self.close)
@@ -0,0 +1,135 @@
+# index_segments.py
+# -*- coding: utf-8 -*-
+
+"""
+增量索引：统计旁路文件与增量段
+
+index_stats.json 记录主索引对应的文档数、每个词的 [df, sum_tf, doc_tf_sum, score]，
+以及之后追加的增量段和已删除的文档号。增量段是 re_idx.delta/ 下的小 JSON 文件，
+保存新文档本身、它们的倒排记录和分词词长。查询加载时由 SegmentedIndex 把主索引和各增量段合并，
+并按统计文件中的最新分数修正 score；压缩（create_rev_table.py --compact）再把它们并回主索引。
+"""
+
+import json
+import os
+import tempfile
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+STATS_PATH = "index_stats.json"
+SEGMENT_DIR = "re_idx.delta"
+LOCK_PATH = "index.lock"
+
+def write_json_atomic(obj, path, **kwargs):
+    """先写临时文件再替换，避免中途退出留下半个文件；临时文件名唯一，多个进程同时写同一文件也不会互相覆盖"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp, path)
+
+@contextmanager
+def index_lock(blocking=True, path=LOCK_PATH):
+    """
+    索引写锁（进程间互斥）：增量更新、压缩和全量构建在整个读-改-写过程中持有。
+    blocking=False 时锁已被占用就不等待，返回 False；拿到锁返回 True
+    """
+    f = open(path, "a+b")
+    try:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        yield True
+    finally:
+        # 关闭文件即释放锁
+        f.close()
+
+def load_stats(path=STATS_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_stats(stats, path=STATS_PATH):
+    write_json_atomic(stats, path)
+
+def load_segment(path):
+    with open(path, encoding="utf-8") as f:
+        seg = json.load(f)
+    seg["postings"] = {term: {int(d): fields for d, fields in postings.items()}
+                       for term, postings in seg["postings"].items()}
+    return seg
+
+def has_updates(stats):
+    return bool(stats and (stats["segments"] or stats["deleted"]))
+
+class SegmentedIndex(Mapping):
+    """主索引 + 增量段的只读合并视图，跳过已删除文档，score 取统计文件中的最新值"""
+
+    def __init__(self, base, segments, deleted, term_scores):
+        self.base = base
+        self.segments = segments
+        self.deleted = set(deleted)
+        self.term_scores = term_scores
+
+    def _sources(self):
+        yield self.base
+        for seg in self.segments:
+            yield seg["postings"]
+
+    def __getitem__(self, term):
+        merged = {}
+        found = False
+        score = self.term_scores.get(term)
+        for source in self._sources():
+            postings = source.get(term)
+            if postings is None:
+                continue
+            found = True
+            for doc_id, fields in postings.items():
+                if doc_id in self.deleted:
+                    continue
+                fields = dict(fields)
+                if fields["title_positions"] or fields["abstract_positions"]:
+                    fields["score"] = score
+                merged[doc_id] = fields
+        if not found:
+            raise KeyError(term)
+        return merged
+
+    def __contains__(self, term):
+        return any(term in source for source in self._sources())
+
+    def __iter__(self):
+        seen = set()
+        for source in self._sources():
+            for term in source:
+                if term not in seen:
+                    seen.add(term)
+                    yield term
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+def apply_updates(docs, inv, doc_tokens, stats):
+    """把增量段里的新文档（及其分词词长）追加到 docs，并把 inv 包装成合并视图"""
+    if not has_updates(stats):
+        return docs, inv, doc_tokens
+    segments = [load_segment(path) for path in stats["segments"]]
+    docs = list(docs)
+    doc_tokens = list(doc_tokens) if doc_tokens is not None else None
+    for seg in segments:
+        docs.extend(seg["docs"])
+        if doc_tokens is not None:
+            doc_tokens.extend(seg["tokens"])
+    term_scores = {term: row[3] for term, row in stats["terms"].items()}
+    return docs, SegmentedIndex(inv, segments, stats["deleted"], term_scores), doc_tokens
@@ -0,0 +1,76 @@
+# index_shards.py
+# -*- coding: utf-8 -*-
+
+"""
+分片索引：按文档号把主索引切成 N 个连续区间，每个分片一个索引文件
+
+    re_idx.shards/manifest.json     {"format", "total_docs", "shards": [{"path", "first_doc_id", "doc_count"}, ...]}
+    re_idx.shards/shard_000.json    （或 .bin）只含该区间文档的倒排记录
+
+分片由全量构建时的同一份倒排索引切出：文档号保持全局编号，score 用全部文档统计出的词分数，
+所以各分片上的得分与单一索引完全相同，合并各分片的前 k 名即为全局前 k 名。
+增量段不进分片，有增量更新或删除时查询端退回单一索引，压缩或重建后再按原分片数重新切分。
+"""
+
+import json
+import os
+import shutil
+from bisect import bisect_right
+
+from bin_index import BinIndex, save_bin_index
+from index_segments import write_json_atomic
+from packed_index import PackedIndex
+
+SHARD_DIR = "re_idx.shards"
+MANIFEST_NAME = "manifest.json"
+
+def shard_ranges(total_docs, n):
+    """把 [0, total_docs) 尽量均匀地切成 n 个连续区间，返回 [(起, 止), ...]"""
+    n = max(1, min(n, total_docs or 1))
+    bounds = [total_docs * i // n for i in range(n + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+def split_postings(inv, ranges):
+    """{词: {文档号: 字段}} -> 每个区间一份同样形式的索引，词在各分片中的顺序与原索引相同"""
+    starts = [lo for lo, _ in ranges]
+    shards = [{} for _ in ranges]
+    for term in inv:
+        for doc_id, fields in inv[term].items():
+            shard = shards[bisect_right(starts, doc_id) - 1]
+            shard.setdefault(term, {})[doc_id] = fields
+    return shards
+
+def save_shards(inv, total_docs, n, index_format, shard_dir=SHARD_DIR):
+    """切分并写出各分片和清单（清单最后写，写到一半中断时查询端看不到不完整的分片），返回清单"""
+    remove_shards(shard_dir)
+    os.makedirs(shard_dir)
+    ranges = shard_ranges(total_docs, n)
+    entries = []
+    for i, ((lo, hi), shard) in enumerate(zip(ranges, split_postings(inv, ranges))):
+        path = os.path.join(shard_dir, f"shard_{i:03d}.{index_format}")
+        if index_format == "bin":
+            save_bin_index(shard, path)
+        else:
+            write_json_atomic(shard, path)
+        entries.append({"path": path, "first_doc_id": lo, "doc_count": hi - lo})
+    manifest = {"format": index_format, "total_docs": total_docs, "shards": entries}
+    write_json_atomic(manifest, os.path.join(shard_dir, MANIFEST_NAME), indent=2)
+    return manifest
+
+def load_manifest(shard_dir=SHARD_DIR):
+    path = os.path.join(shard_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def remove_shards(shard_dir=SHARD_DIR):
+    if os.path.exists(shard_dir):
+        shutil.rmtree(shard_dir)
+
+def load_shard(path, index_format):
+    if index_format == "bin":
+        return BinIndex(path)
+    with open(path, encoding="utf-8") as f:
+        inv = json.load(f)
+    return PackedIndex({term: {int(d): fields for d, fields in postings.items()} for term, postings in inv.items()})
@@ -0,0 +1,86 @@
+# loadtest.py
+# -*- coding: utf-8 -*-
+
+"""
+检索服务压测：多个客户端线程各自保持一条 keep-alive 连接，循环发送查询，
+统计 QPS 和 p50/p99 延迟。先启动 server.py，再运行
+    python loadtest.py --clients 8 --requests 2000 [--queries 查询文件]
+查询文件每行一个查询串。
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlencode
+
+DEFAULT_QUERIES = ["信息检索", "机器学习", "神经网络", "图像识别", "数据挖掘",
+                   "深度学习 卷积", "自然语言处理", "推荐系统", "无线通信", "区块链"]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+def run_client(host, port, queries, k, n, offset, latencies, errors):
+    conn = http.client.HTTPConnection(host, port)
+    for i in range(n):
+        q = queries[(offset + i) % len(queries)]
+        path = "/search?" + urlencode({"q": q, "k": k})
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+                continue
+            json.loads(body)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="检索服务压测")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=1000, help="总请求数")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", help="查询文件，每行一个查询串")
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = DEFAULT_QUERIES
+
+    latencies = []
+    errors = []
+    per_client = [args.requests // args.clients + (i < args.requests % args.clients)
+                  for i in range(args.clients)]
+    threads = [threading.Thread(target=run_client,
+                                args=(args.host, args.port, queries, args.k, n,
+                                      i * len(queries) // args.clients, latencies, errors))
+               for i, n in enumerate(per_client)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"请求 {len(latencies)} 个成功，{len(errors)} 个失败，用时 {elapsed:.2f}s")
+    print(f"QPS {len(latencies) / elapsed:.1f}")
+    print(f"延迟 p50 {percentile(latencies, 50) * 1000:.2f}ms  p99 {percentile(latencies, 99) * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
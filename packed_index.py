@@ -0,0 +1,199 @@
+# packed_index.py
+# -*- coding: utf-8 -*-
+
+"""
+内存中的紧凑倒排索引
+
+json 索引解析成 {词: {文档号: {四个位置表, "score"}}} 后，每个 (词, 文档) 要几百字节：
+一个 dict、四个 list（大多为空）和一个对该词所有文档都相同的 float。PackedIndex 改为：
+
+    词 -> 词号          每个词一个分数 scores[词号]
+    starts[词号]        该词的倒排记录在下面几个数组中的起点，区间为 [starts[i], starts[i+1])
+    doc_ids             array('i')，每个词内按文档号升序
+    masks               每条倒排记录一个字节，第 0~3 位表示 title/abstract/author/keyword 中是否出现
+    offsets             array('I')，该记录的位置数据在 positions 中的起点
+    positions           array('H')（有超过 65535 的值时为 array('I')），每个出现的字段依次为 个数, 位置...
+
+对外仍是只读的 {词: {文档号: 字段}}：取词得到 PackedPostings 视图，取文档得到 Posting（__slots__），
+位置表在访问时才从 positions 中切出。score 对标题/摘要命中的文档为词分数，只在作者/关键词中命中的为1，
+与 build_postings、BinIndex 相同。PackedPostings.arrays() 直接由连续数组给出向量化计分用的数组。
+"""
+
+import math
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+
+from bin_index import FIELDS
+
+KEYS = FIELDS + ("score",)
+BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+TEXT_MASK = BITS["title_positions"] | BITS["abstract_positions"]
+
+class Posting(Mapping):
+    """一条倒排记录：{"title_positions", "abstract_positions", "author_positions", "keyword_positions", "score"}"""
+
+    __slots__ = ("_index", "_i", "_score")
+
+    def __init__(self, index, i, score):
+        self._index = index
+        self._i = i
+        self._score = score
+
+    def __getitem__(self, key):
+        mask = self._index.masks[self._i]
+        if key == "score":
+            return self._score if mask & TEXT_MASK else 1.0
+        bit = BITS[key]
+        if not mask & bit:
+            return []
+        positions = self._index.positions
+        p = self._index.offsets[self._i]
+        # 跳过位掩码中排在前面的字段
+        for lower in range(bit.bit_length() - 1):
+            if mask >> lower & 1:
+                p += positions[p] + 1
+        return positions[p + 1:p + 1 + positions[p]].tolist()
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self):
+        return len(KEYS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        # 只序列化这一条记录，不带上整个紧凑索引
+        return _unpickle_posting, _slice_index(self._index, self._i, self._i + 1, self._score)
+
+class PackedPostings(Mapping):
+    """一个词的倒排记录 {文档号: Posting}，按文档号升序遍历"""
+
+    __slots__ = ("_index", "_lo", "_hi", "_score")
+
+    def __init__(self, index, term_id):
+        self._index = index
+        self._lo = index.starts[term_id]
+        self._hi = index.starts[term_id + 1]
+        self._score = index.scores[term_id]
+
+    def _find(self, doc_id):
+        doc_ids = self._index.doc_ids
+        i = bisect_left(doc_ids, doc_id, self._lo, self._hi)
+        return i if i < self._hi and doc_ids[i] == doc_id else -1
+
+    def __getitem__(self, doc_id):
+        i = self._find(doc_id)
+        if i < 0:
+            raise KeyError(doc_id)
+        return Posting(self._index, i, self._score)
+
+    def get(self, doc_id, default=None):
+        # 计分时按文档号查找最频繁，不走 Mapping.get 的 try/except
+        i = self._find(doc_id)
+        return default if i < 0 else Posting(self._index, i, self._score)
+
+    def __contains__(self, doc_id):
+        return self._find(doc_id) >= 0
+
+    def __iter__(self):
+        return iter(self._index.doc_ids[self._lo:self._hi])
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def ids(self):
+        """升序文档号的只读视图（memoryview），不复制"""
+        return memoryview(self._index.doc_ids)[self._lo:self._hi]
+
+    def arrays(self):
+        """
+        (文档号, 字段位掩码, score)，与 topk.posting_arrays 的结果相同，不经过逐条的 Posting；
+        位掩码是紧凑索引中数组的只读视图；文档号转成 int64（花式索引用 int32 反而更慢）
+        """
+        index = self._index
+        ids = np.frombuffer(index.doc_ids, dtype=np.int32)[self._lo:self._hi].astype(np.int64)
+        masks = np.frombuffer(index.masks, dtype=np.uint8)[self._lo:self._hi]
+        scores = np.where(masks & TEXT_MASK, self._score, 1.0)
+        return ids, masks, scores
+
+    def __reduce__(self):
+        # 多进程批量查询把各词的倒排记录传给子进程，只序列化本词的切片
+        return _unpickle_postings, _slice_index(self._index, self._lo, self._hi, self._score)
+
+def _slice_index(index, lo, hi, score):
+    """紧凑索引中 [lo, hi) 这段倒排记录的各数组，位置偏移改为从0开始"""
+    start = index.offsets[lo]
+    end = index.offsets[hi] if hi < len(index.offsets) else len(index.positions)
+    offsets = array("I", (p - start for p in index.offsets[lo:hi]))
+    return index.doc_ids[lo:hi], index.masks[lo:hi], offsets, index.positions[start:end], score
+
+def _single_term_index(doc_ids, masks, offsets, positions, score):
+    index = PackedIndex.__new__(PackedIndex)
+    index.terms = {}
+    index.scores = array("d", [score])
+    index.starts = array("I", [0, len(doc_ids)])
+    index.doc_ids = doc_ids
+    index.offsets = offsets
+    index.masks = masks
+    index.positions = positions
+    return index
+
+def _unpickle_postings(*args):
+    return PackedPostings(_single_term_index(*args), 0)
+
+def _unpickle_posting(*args):
+    return Posting(_single_term_index(*args), 0, args[-1])
+
+class PackedIndex(Mapping):
+    """由 {词: {文档号: 字段}} 构建，之后只读"""
+
+    def __init__(self, inv):
+        self.terms = {}
+        self.scores = array("d")
+        self.starts = array("I", [0])
+        self.doc_ids = array("i")
+        self.offsets = array("I")
+        masks = bytearray()
+        positions = array("I")
+        for term in inv:
+            postings = inv[term]
+            score = math.nan
+            for doc_id in sorted(postings):
+                fields = postings[doc_id]
+                mask = 0
+                self.doc_ids.append(doc_id)
+                self.offsets.append(len(positions))
+                for name, bit in BITS.items():
+                    poses = fields[name]
+                    if poses:
+                        mask |= bit
+                        positions.append(len(poses))
+                        positions.extend(poses)
+                if mask & TEXT_MASK and math.isnan(score):
+                    score = fields["score"]
+                masks.append(mask)
+            self.terms[term] = len(self.terms)
+            self.scores.append(score)
+            self.starts.append(len(self.doc_ids))
+        self.masks = bytes(masks)
+        self.positions = array("H", positions) if not positions or max(positions) <= 0xFFFF else positions
+
+    def __getitem__(self, term):
+        return PackedPostings(self, self.terms[term])
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def posting_count(self):
+        return len(self.doc_ids)
@@ -0,0 +1,124 @@
+# phrase.py
+# -*- coding: utf-8 -*-
+
+"""
+短语与邻近度：直接在倒排记录的位置表上计算
+
+倒排记录中的位置是去掉停用词后的词序号，短语 "t1 t2 … tn" 命中即同一字段中
+存在 p 使 ti 出现在 p + i - 1。先按文档号对各词的倒排记录做跳跃（galloping）求交，
+只对交集中的文档合并位置表；邻近度取查询中相邻两词在同一字段内的最小距离。
+"""
+
+from bisect import bisect_left
+
+TEXT_FIELDS = ("title_positions", "abstract_positions")
+
+def gallop_intersect(small, large):
+    """两个升序文档号列表求交：对 small 中每个元素在 large 中倍增步长定位再二分"""
+    if len(small) > len(large):
+        small, large = large, small
+    result = []
+    lo = 0
+    n = len(large)
+    for x in small:
+        step = 1
+        hi = lo
+        while hi < n and large[hi] < x:
+            lo = hi + 1
+            hi += step
+            step *= 2
+        lo = bisect_left(large, x, lo, min(hi + 1, n))
+        if lo == n:
+            break
+        if large[lo] == x:
+            result.append(x)
+            lo += 1
+    return result
+
+def sorted_doc_ids(postings):
+    """
+    倒排记录的升序文档号表。PackedPostings 本身按文档号连续存放，直接取视图，不复制也不排序；
+    其他倒排记录（二进制索引解码、增量段合并的结果）本来就按文档号插入，排序只需线性的一遍检查
+    """
+    ids = getattr(postings, "ids", None)
+    return ids() if ids is not None else sorted(postings)
+
+def intersect_ids(id_lists):
+    """多个升序文档号列表的交集，从最短的开始依次求交"""
+    if not id_lists:
+        return []
+    id_lists = sorted(id_lists, key=len)
+    result = id_lists[0]
+    for other in id_lists[1:]:
+        if not result:
+            break
+        result = gallop_intersect(result, other)
+    return result
+
+def intersect_docs(postings_list):
+    """多个倒排记录的文档号交集（升序）"""
+    return intersect_ids([sorted_doc_ids(p) for p in postings_list])
+
+def _has_phrase(position_lists):
+    starts = set(position_lists[0])
+    for offset, poses in enumerate(position_lists[1:], 1):
+        starts.intersection_update(p - offset for p in poses)
+        if not starts:
+            return False
+    return True
+
+def has_phrase(postings_list, doc_id, fields=TEXT_FIELDS):
+    """文档 doc_id 的 fields 之一中是否含该短语"""
+    entries = [p.get(doc_id) for p in postings_list]
+    if None in entries:
+        return False
+    for field in fields:
+        position_lists = [f[field] for f in entries]
+        if all(position_lists) and _has_phrase(position_lists):
+            return True
+    return False
+
+def phrase_docs(postings_list, fields=TEXT_FIELDS):
+    """短语各词的倒排记录（按短语顺序）-> fields（默认标题或摘要）中含该短语的文档号集合"""
+    return {doc_id for doc_id in intersect_docs(postings_list)
+            if has_phrase(postings_list, doc_id, fields)}
+
+def min_distance(a, b):
+    """
+    两个升序位置表之间的最小距离，任一为空返回 None。
+    对较短表的每个位置在较长表中二分找左右邻居；同一字段不同词的位置不会重合，距离为1即可返回
+    """
+    if not a or not b:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    n = len(b)
+    best = n + a[-1] + b[-1]
+    for x in a:
+        i = bisect_left(b, x)
+        if i < n and b[i] - x < best:
+            best = b[i] - x
+        if i and x - b[i - 1] < best:
+            best = x - b[i - 1]
+        if best <= 1:
+            break
+    return best
+
+def proximity_scores(postings_list):
+    """
+    查询中相邻两个（不同的）词在同一文档同一字段中的最小距离 d，每对贡献 1/d；
+    返回 {文档号: 各对贡献之和}，只包含至少有一对同时出现的文档
+    """
+    scores = {}
+    ids = [sorted_doc_ids(p) for p in postings_list]
+    for n in range(len(postings_list) - 1):
+        a, b = postings_list[n], postings_list[n + 1]
+        for doc_id in intersect_ids(ids[n:n + 2]):
+            best = None
+            for field in TEXT_FIELDS:
+                d = min_distance(a[doc_id][field], b[doc_id][field])
+                if d is not None and (best is None or d < best):
+                    best = d
+            if best:
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / best
+    return scores
@@ -1,19 +1,41 @@
 # query.py
 # -*- coding: utf-8 -*-
 
+import time
+_T0 = time.perf_counter()
+
+import argparse
+import heapq
 import json
-import jieba
-import pyreadline   # 历史命令和箭头上下切换
-from collections import defaultdict
-import datetime
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from term_dict import TermMatcher, collect_terms_from_index, load_term_dict
+from term_expand import load_expansion_table
+from bin_index import BinIndex
+from packed_index import PackedIndex
+from index_segments import STATS_PATH, apply_updates, has_updates, load_stats
+import index_shards
+import numpy as np
+from topk import FIELD_BITS, posting_arrays, rank_candidates, rank_exhaustive, rank_maxscore, rank_vectorized
+from phrase import TEXT_FIELDS, proximity_scores
+import boolean_query
+import tracing
+from snippets import Highlighter, load_doc_tokens
+# jieba 在第一次分词时才导入，并从预先生成的缓存载入词典
+from startup_cache import (BIN_INDEX_PATH, DOC_TOKENS_PATH, DOCS_PATH, INDEX_PATH, TERM_DICT_PATH,
+                           TERM_EXPAND_PATH, init_jieba, load_snapshot, save_snapshot, snapshot_key,
+                           snapshot_sources, source_signature)
+from query_cache import QueryCache
+from feedback_log import FeedbackWriter
 
 # ----------------- 配置区 -----------------
-DATA_PATH = "papers.json"
-INDEX_PATH = "re_idx.json"
+COMPACT_SEGMENTS = 8    # 增量段达到这个数量时在后台压缩
 LOG_PATH = "feedback.log"
-
-import logging
-logging.getLogger("jieba").setLevel(logging.ERROR)
+FEEDBACK_JSONL_PATH = "feedback.jsonl"  # 同样的评价记录，每行一个 JSON
 
 # 加载停用词表
 zh_stop = set()
@@ -26,102 +48,468 @@ AUTHOR_WEIGHT   = 50.0
 KEYWORD_WEIGHT  = 10.0
 ABSTRACT_WEIGHT = 1.0
 
-SNIPPET_WINDOW = 20
+SNIPPET_WINDOW = 20     # 摘要片段在命中最密集处前后各约保留的词数
+RENDER_CACHE_SIZE = 1024
+RENDER_WORKERS = 0      # 大于0时前 k 条结果在这么多个线程中并行渲染
 TOPK = 10
+PROXIMITY_WEIGHT = 2.0  # 邻近度加分：相邻两个查询词最小距离为 d 时加 权重 / d
+# 向量化计分：倒排记录转成 NumPy 数组后在稠密得分向量上散加；False 时用 MaxScore 剪枝。
+# 紧凑索引 PackedIndex 直接从连续数组切出，其他索引（二进制、增量段合并）转换后放进 LRU 缓存，
+# 缓存的倒排记录总数不超过 ARRAY_CACHE_POSTINGS（每条约 17 字节）
+VECTORIZED = True
+ARRAY_CACHE_POSTINGS = 2_000_000
+# 查询扩展：查询词的文档频率之和小于 EXPAND_MIN_DOCS 时，用 term_expand.json 中的近似词/共现关键词补充，
+# 每个查询词最多 EXPAND_FANOUT 个，扩展词的倒排记录总数不超过 EXPAND_POSTING_BUDGET，
+# 扩展词按原字段权重 × EXPANSION_WEIGHT 计分，只用来补召回：只由扩展词命中的文档排在原查询词命中的文档之后，
+# 不改变原结果的得分和顺序；EXPAND_FANOUT = 0 时关闭
+EXPAND_MIN_DOCS = TOPK
+EXPAND_FANOUT = 3
+EXPAND_POSTING_BUDGET = 5000
+EXPANSION_WEIGHT = 0.5
+
+# 引号括起的部分为短语，结果的标题或摘要中必须连续出现这些词；
+# 含 AND/OR/NOT 或 title:/abstract:/author:/keyword:/date: 前缀时按布尔查询解析（见 boolean_query.py），只有括号不算
+QUOTED = re.compile(r'"([^"]*)"|“([^”]*)”')
+QUOTE_CHARS = str.maketrans({c: " " for c in '"“”'})
+
+CACHE_SIZE = 1024       # 查询结果缓存条数
+CACHE_TTL = 3600        # 缓存条目有效期（秒）
+CACHE_PATH = "query_cache.pkl"
 # ------------------------------------------
 
-def load_data():
-    with open(DATA_PATH, encoding='utf-8') as f:
+class StartupProfile:
+    """记录启动各阶段耗时"""
+
+    def __init__(self):
+        self.phases = [("导入模块", time.perf_counter() - _T0)]
+        self._last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self):
+        total = sum(t for _, t in self.phases)
+        lines = [f"{t * 1000:9.1f}ms  {name}" for name, t in self.phases]
+        lines.append(f"{total * 1000:9.1f}ms  合计")
+        return "\n".join(lines)
+
+def index_version(index_format):
+    """当前磁盘上索引的版本：统计文件和主索引文件的签名，重建/增量更新/压缩后都会变化"""
+    index_path = BIN_INDEX_PATH if index_format == "bin" else INDEX_PATH
+    sig = source_signature([STATS_PATH, index_path])
+    return ";".join(f"{path}:{value}" for path, value in sig.items())
+
+def open_cache(index_format, path=None):
+    """在加载索引之前调用，缓存绑定的是即将加载的索引版本"""
+    return QueryCache(index_version(index_format), CACHE_SIZE, CACHE_TTL, path)
+
+def load_sources(index_format):
+    """读取并解析 papers.json、re_idx.json（仅 json 格式，转成紧凑的 PackedIndex）、分词词长和作者/关键词词典"""
+    with open(DOCS_PATH, encoding='utf-8') as f:
         docs = json.load(f)
-    with open(INDEX_PATH, encoding='utf-8') as f:
-        inv = json.load(f)
-        inv = {term: {int(d): fields for d, fields in postings.items()}
-               for term, postings in inv.items()}
-    return docs, inv
-
-def highlight_title(title, hit_list):
-    title_terms = [term for (field, term) in hit_list if field == 'title']
-    unique_terms = list(set(title_terms))
-    unique_terms.sort(key=lambda x: len(x), reverse=True)
-    tokens = list(jieba.cut(title))
-    highlighted = [False] * len(tokens)
-    for term in unique_terms:
-        for i, token in enumerate(tokens):
-            if token == term and not highlighted[i]:
-                tokens[i] = f'【{token}】'
-                highlighted[i] = True
-    return ''.join(tokens)
-
-def highlight_abstract(abstract, hit_list):
-    abstract_terms = [term for (field, term) in hit_list if field == 'abstract']
-    unique_terms = list(set(abstract_terms))
-    unique_terms.sort(key=lambda x: len(x), reverse=True)
-    tokens = list(jieba.cut(abstract))
-    highlighted = [False] * len(tokens)
-    for term in unique_terms:
-        for i, token in enumerate(tokens):
-            if token == term and not highlighted[i]:
-                tokens[i] = f'【{token}】'
-                highlighted[i] = True
-    return ''.join(tokens)
-
-def highlight_authors(authors, hit_list):
-    hit_terms = {term for (field, term) in hit_list if field == 'author'}
-    return [f'【{a}】' if a in hit_terms else a for a in authors]
-
-def highlight_keywords(keywords, hit_list):
-    hit_terms = {term for (field, term) in hit_list if field == 'keyword'}
-    return [f'【{kw}】' if kw in hit_terms else kw for kw in keywords]
-
-def search(docs, inv, query):
-    tokens = [t for t in jieba.cut(query) if t.strip() and t not in zh_stop]
-    author_terms = [name for doc in docs for name in doc.get("author", []) if name in query]
-    keyword_terms = [kw for doc in docs for kw in doc.get("keyword", []) if kw in query]
-
-    scores = defaultdict(float)
-    hits  = defaultdict(list)
-
-    for term in tokens:
-        posting = inv.get(term, {})
-        for doc_id, fields in posting.items():
-            if fields["title_positions"]:
-                scores[doc_id] += TITLE_WEIGHT * fields["score"]
-                hits[doc_id].append(("title", term))
-            if fields["abstract_positions"]:
-                scores[doc_id] += ABSTRACT_WEIGHT * fields["score"]
-                hits[doc_id].append(("abstract", term))
-
-    for name in set(author_terms):
-        posting = inv.get(name, {})
-        for doc_id, fields in posting.items():
-            if fields["author_positions"]:
-                scores[doc_id] += AUTHOR_WEIGHT * fields["score"]
-                hits[doc_id].append(("author", name))
-
-    for kw in set(keyword_terms):
-        posting = inv.get(kw, {})
-        for doc_id, fields in posting.items():
-            if fields["keyword_positions"]:
-                scores[doc_id] += KEYWORD_WEIGHT * fields["score"]
-                hits[doc_id].append(("keyword", kw))
-
-    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:TOPK]
-    results = []
-    for doc_id, score in ranked:
-        doc = docs[doc_id]
-        hit_list = hits.get(doc_id, [])
-        results.append({
-            "score": score,
-            "title": highlight_title(doc.get("title", ""), hit_list),
-            "snippet": highlight_abstract(doc.get("abstract", ""), hit_list),
-            "url": doc.get("url", ""),
-            "date": doc.get("date", ""),
-            "author": highlight_authors(doc.get("author", []), hit_list),
-            "keyword": highlight_keywords(doc.get("keyword", []), hit_list)
-        })
-    return results
-
-def get_feedback(last_query, last_results):
+    inv = None
+    if index_format == "json":
+        with open(INDEX_PATH, encoding='utf-8') as f:
+            inv = json.load(f)
+            inv = PackedIndex({term: {int(d): fields for d, fields in postings.items()}
+                               for term, postings in inv.items()})
+    doc_tokens = load_doc_tokens(DOC_TOKENS_PATH) if os.path.exists(DOC_TOKENS_PATH) else None
+    term_dict = load_term_dict(TERM_DICT_PATH) if os.path.exists(TERM_DICT_PATH) else None
+    return docs, inv, doc_tokens, term_dict
+
+def load_data(index_format="json", profile=None):
+    profile = profile or StartupProfile()
+    # 先取源文件签名再读文件，读的过程中文件若被改写，下次启动会发现快照过期
+    key = snapshot_key(index_format, snapshot_sources(index_format))
+    snapshot = load_snapshot(key)
+    if snapshot is not None:
+        docs, inv, doc_tokens, term_dict = (snapshot[name] for name in ("docs", "inv", "doc_tokens", "term_dict"))
+        profile.mark("读取快照")
+    else:
+        docs, inv, doc_tokens, term_dict = load_sources(index_format)
+        profile.mark("解析源文件")
+        save_snapshot(key, docs, inv, doc_tokens, term_dict)
+        profile.mark("写入快照")
+    if index_format == "bin":
+        # mmap 打开，查询时只解码用到的词的倒排记录
+        inv = BinIndex(BIN_INDEX_PATH)
+        if inv.doc_count is not None and inv.doc_count != len(docs):
+            # 索引中的文档号对不上 papers.json，检索结果会指向错误或不存在的文档
+            inv.close()
+            raise SystemExit(f"{BIN_INDEX_PATH} 由 {inv.doc_count} 篇文档构建，{DOCS_PATH} 中有 {len(docs)} 篇，"
+                             f"请重新构建索引：python create_rev_table.py --format bin")
+    # 合并增量段
+    stats = load_stats(STATS_PATH)
+    docs, inv, doc_tokens = apply_updates(docs, inv, doc_tokens, stats)
+    if stats and len(stats["segments"]) >= COMPACT_SEGMENTS:
+        start_compaction()
+    if term_dict is None:
+        # 兼容没有词典文件的旧索引
+        term_dict = TermMatcher(*collect_terms_from_index(inv))
+    highlighter = Highlighter(docs, doc_tokens, window=SNIPPET_WINDOW, cache_size=RENDER_CACHE_SIZE)
+    profile.mark("打开索引/增量段")
+    expansion_table()
+    profile.mark("读取扩展表")
+    return docs, inv, term_dict, highlighter
+
+def start_compaction():
+    """在后台线程中把增量段并回主索引，当前进程继续使用已加载的数据"""
+    def run():
+        import create_rev_table
+        # 其他进程正在更新或压缩时不等待，交给它们完成
+        create_rev_table.compact_index(wait=False)
+    threading.Thread(target=run, name="compaction").start()
+
+def text_score(postings):
+    """词在标题/摘要中的分数（对该词的所有文档相同），没有出现在标题/摘要中返回0"""
+    for fields in postings.values():
+        if fields["title_positions"] or fields["abstract_positions"]:
+            return fields["score"]
+    return 0.0
+
+def _text_list(term, postings, scale=1.0):
+    return (term, postings,
+            (("title_positions", TITLE_WEIGHT * scale, "title"),
+             ("abstract_positions", ABSTRACT_WEIGHT * scale, "abstract")),
+            (TITLE_WEIGHT + ABSTRACT_WEIGHT) * scale * text_score(postings))
+
+def _keyword_list(kw, postings, scale=1.0):
+    return (kw, postings, (("keyword_positions", KEYWORD_WEIGHT * scale, "keyword"),), KEYWORD_WEIGHT * scale)
+
+class ExpansionPostings(dict):
+    """扩展词去掉原查询词已命中文档后的倒排记录；只属于这一次查询，不进按词缓存的 LRU"""
+
+def scoring_lists(inv, tokens, author_terms, keyword_terms, expansions=()):
+    """
+    查询的计分表，顺序即累加顺序：[(词, 倒排记录, 字段, 上界), ...]
+    上界 = 字段权重之和 × 词分数；作者/关键词命中的 score 不超过1；
+    扩展词排在最后，权重乘以 EXPANSION_WEIGHT，只保留原查询词没有命中的文档
+    """
+    lists = [_text_list(term, inv.get(term, {})) for term in tokens]
+    for name in sorted(author_terms):
+        lists.append((name, inv.get(name, {}),
+                      (("author_positions", AUTHOR_WEIGHT, "author"),), AUTHOR_WEIGHT))
+    lists += [_keyword_list(kw, inv.get(kw, {})) for kw in sorted(keyword_terms)]
+    if expansions:
+        # 只有低召回的查询才扩展，原查询词的倒排记录很短
+        matched = {doc_id for _, postings, fields, _ in lists for doc_id, f in postings.items()
+                   if any(f[key] for key, _, _ in fields)}
+        for term, kind in expansions:
+            postings = ExpansionPostings((d, f) for d, f in inv.get(term, {}).items() if d not in matched)
+            make = _keyword_list if kind == "keyword" else _text_list
+            lists.append(make(term, postings, EXPANSION_WEIGHT))
+    return lists
+
+def segment(text):
+    """与建索引时相同：分词后去掉空白和停用词，索引中的位置就是在这个词序列中的序号"""
+    return [t for t in init_jieba().cut(text) if t.strip() and t not in zh_stop]
+
+def parse_query(term_dict, query):
+    """
+    查询串分词，并找出其中的作者名、关键词和过滤条件，返回 (词列表, 作者集合, 关键词集合, 条件树, 扩展词)。
+    普通查询的条件树只由引号括起的短语组成（没有短语时为 None）；
+    布尔查询的计分词、作者和关键词只取不在 NOT 之下的部分。
+    扩展词为 ((词, "text" 或 "keyword"), ...)，只对没有条件树的低召回查询生成
+    """
+    if boolean_query.is_boolean(boolean_query.tokenize(query)):
+        with tracing.span("parse_boolean"):
+            return (*boolean_query.parse(query, segment, term_dict), ())
+    with tracing.span("segment"):
+        phrases = []
+        for m in QUOTED.finditer(query):
+            words = segment(m.group(1) if m.group(1) is not None else m.group(2))
+            if words:
+                phrases.append(("phrase", TEXT_FIELDS, tuple(words)))
+        # 短语中的词照常参与计分；没有引号时分词结果与原来相同
+        tokens = segment(query.translate(QUOTE_CHARS))
+    # 一次扫描查询串，找出其中包含的全部作者名和关键词
+    with tracing.span("match_terms"):
+        author_terms, keyword_terms = term_dict.match(query)
+    condition = boolean_query.combine("and", phrases)
+    return tokens, author_terms, keyword_terms, condition, expand_terms(tokens, author_terms, keyword_terms, condition)
+
+_expansion_table = None
+_expansion_lock = threading.Lock()
+
+def expansion_table():
+    """term_expand.json 第一次用到时读入，之后一直使用；没有这个文件（旧索引）时为 None"""
+    global _expansion_table
+    with _expansion_lock:
+        if _expansion_table is None:
+            _expansion_table = (load_expansion_table(TERM_EXPAND_PATH)
+                                if os.path.exists(TERM_EXPAND_PATH) else False)
+    return _expansion_table or None
+
+def expand_terms(tokens, author_terms, keyword_terms, condition):
+    table = expansion_table() if condition is None and EXPAND_FANOUT > 0 else None
+    if table is None:
+        return ()
+    with tracing.span("expand"):
+        return table.expand(tokens, author_terms, keyword_terms,
+                            EXPAND_MIN_DOCS, EXPAND_FANOUT, EXPAND_POSTING_BUDGET)
+
+_doc_dates = {}
+
+def doc_dates(docs, inv):
+    """文档号 -> 日期，已删除的文档为 None；docs 加载后不再变化，按对象缓存"""
+    cached = _doc_dates.get(id(docs))
+    if cached is None or cached[0] is not docs:
+        deleted = getattr(inv, "deleted", ())
+        dates = [None if d in deleted else doc.get("date", "") for d, doc in enumerate(docs)]
+        cached = _doc_dates[id(docs)] = (docs, dates)
+    return cached[1]
+
+class PostingArraysCache:
+    """词 -> posting_arrays 的结果，LRU 淘汰，缓存的倒排记录总数不超过 max_postings；多个线程可以同时使用"""
+
+    def __init__(self, max_postings=ARRAY_CACHE_POSTINGS):
+        self.max_postings = max_postings
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, term, postings):
+        with self._lock:
+            arrays = self._items.get(term)
+            if arrays is not None:
+                self._items.move_to_end(term)
+                return arrays
+        arrays = posting_arrays(postings)
+        with self._lock:
+            if term not in self._items:
+                self._items[term] = arrays
+                self.size += len(arrays[0])
+                while self.size > self.max_postings and self._items:
+                    _, old = self._items.popitem(last=False)
+                    self.size -= len(old[0])
+        return arrays
+
+_posting_arrays = None
+_posting_arrays_lock = threading.Lock()
+
+def posting_arrays_cache(inv):
+    """
+    当前索引的 PostingArraysCache；只为最近一次用到的索引保留缓存，
+    换了索引（如压缩后重新加载）旧缓存即丢弃。能弱引用的索引对象不会因为缓存而无法释放
+    """
+    global _posting_arrays
+    with _posting_arrays_lock:
+        cached = _posting_arrays
+        if cached is None or cached[0]() is not inv:
+            try:
+                ref = weakref.ref(inv)
+            except TypeError:
+                # 普通 dict（如批量查询预取的倒排记录）不能弱引用
+                ref = lambda inv=inv: inv
+            cached = _posting_arrays = (ref, PostingArraysCache())
+    return cached[1]
+
+def rank_query(inv, parsed, exhaustive=False, k=TOPK, proximity=False, dates=None):
+    """
+    dates 为 doc_dates 的结果，条件树含日期范围或单独的 NOT 时必须提供；
+    inv 为 ShardCoordinator 时交给各分片进程计分后合并
+    """
+    if isinstance(inv, ShardCoordinator):
+        with tracing.span("shards"):
+            return inv.rank(parsed, exhaustive, k, proximity)
+    tokens, author_terms, keyword_terms, condition, expansions = parsed
+    with tracing.span("postings"):
+        lists = scoring_lists(inv, tokens, author_terms, keyword_terms, expansions)
+    if tracing.enabled():
+        tracing.count("postings", sum(len(x[1]) for x in lists))
+    fetched = {term: postings for term, postings, _, _ in lists}
+
+    def postings_of(term):
+        if term not in fetched:
+            fetched[term] = inv.get(term, {})
+        return fetched[term]
+
+    boosts = None
+    if proximity:
+        # 邻近度作为一张额外的计分表参与 MaxScore，上界取其中最大的加分；排在扩展词之前
+        with tracing.span("proximity"):
+            boosts = proximity_scores([postings_of(t) for t in dict.fromkeys(tokens)])
+        if boosts:
+            lists.insert(len(lists) - len(expansions),
+                         ("", {d: {"proximity": True, "score": b} for d, b in boosts.items()},
+                          (("proximity", PROXIMITY_WEIGHT, "proximity"),),
+                          PROXIMITY_WEIGHT * max(boosts.values())))
+    if condition is not None:
+        # 只对满足条件的文档计分，包括只满足日期、NOT 等条件而没有计分词命中的（得分为0）
+        with tracing.span("filter"):
+            allowed = boolean_query.evaluate(condition, postings_of, dates)
+        with tracing.span("rank"):
+            return rank_candidates(lists, allowed, k)
+    split = len(lists) - len(expansions)
+    ranked = _rank_lists(inv, lists[:split], exhaustive, k, boosts)
+    if split < len(lists) and len(ranked) < k:
+        # 扩展词只补召回：只由扩展词命中的文档排在原查询词命中的全部文档之后
+        ranked += _rank_lists(inv, lists[split:], exhaustive, k - len(ranked), boosts)
+    return ranked
+
+def _rank_lists(inv, lists, exhaustive, k, boosts):
+    if VECTORIZED and not exhaustive:
+        with tracing.span("arrays"):
+            cache = posting_arrays_cache(inv)
+            arrays = []
+            for term, postings, _, _ in lists:
+                if term == "":
+                    n = len(boosts)
+                    arrays.append((np.fromiter(boosts, dtype=np.int64, count=n),
+                                   np.full(n, FIELD_BITS["proximity"], dtype=np.uint8),
+                                   np.fromiter(boosts.values(), dtype=np.float64, count=n)))
+                    continue
+                if not postings or isinstance(postings, ExpansionPostings):
+                    # 扩展词的倒排记录只属于这次查询，由 rank_vectorized 现场转换，不占缓存
+                    arrays.append(None)
+                elif hasattr(postings, "arrays"):
+                    # 紧凑索引的切片很便宜，不占缓存
+                    arrays.append(postings.arrays())
+                else:
+                    arrays.append(cache.get(term, postings))
+        with tracing.span("rank"):
+            return rank_vectorized(lists, k, arrays)
+    # exhaustive=True 时对全部倒排记录逐个计分（用于核对），否则用 MaxScore 剪枝只保留前 k 名
+    rank = rank_exhaustive if exhaustive else rank_maxscore
+    with tracing.span("rank"):
+        return rank(lists, k)
+
+def result_order(expansions):
+    """
+    排序结果的合并顺序：原查询词命中的文档在前，只由扩展词命中的在后，各自按 (得分降序, 文档号升序)；
+    与 rank_query 分两段取前 k 名的结果相同
+    """
+    expanded = {term for term, _ in expansions}
+    return lambda x: (bool(expanded) and all(term in expanded for _, term in x[2]), -x[1], x[0])
+
+_shard_inv = None
+_shard_dates = None
+
+def _init_shard_worker(path, index_format, dates):
+    global _shard_inv, _shard_dates
+    _shard_inv = index_shards.load_shard(path, index_format)
+    _shard_dates = dates
+
+def _shard_size():
+    return len(_shard_inv)
+
+def _rank_shard(parsed, exhaustive, k, proximity):
+    return rank_query(_shard_inv, parsed, exhaustive, k, proximity, _shard_dates)
+
+class ShardCoordinator:
+    """
+    分片检索：每个分片一个常驻进程，各自加载自己的分片索引。
+    查询同时发给所有分片，各分片按同样的规则取前 k 名，合并后按 (得分降序, 文档号升序) 取前 k 名，
+    与在单一索引上检索的结果相同。多个线程可以同时调用 rank
+    """
+
+    def __init__(self, manifest, dates):
+        self.pools = []
+        for entry in manifest["shards"]:
+            lo = entry["first_doc_id"]
+            hi = lo + entry["doc_count"]
+            # 分片外的文档日期记为 None，单独的 NOT 和日期范围只在本分片的文档中取
+            shard_dates = [date if lo <= d < hi else None for d, date in enumerate(dates)]
+            self.pools.append(ProcessPoolExecutor(
+                max_workers=1, initializer=_init_shard_worker,
+                initargs=(entry["path"], manifest["format"], shard_dates)))
+        # 启动时就让各进程并行加载分片，而不是等到第一个查询
+        for future in [pool.submit(_shard_size) for pool in self.pools]:
+            future.result()
+
+    def rank(self, parsed, exhaustive=False, k=TOPK, proximity=False):
+        futures = [pool.submit(_rank_shard, parsed, exhaustive, k, proximity) for pool in self.pools]
+        ranked = [r for future in futures for r in future.result()]
+        return heapq.nsmallest(k, ranked, key=result_order(parsed[4]))
+
+    def close(self):
+        for pool in self.pools:
+            pool.shutdown()
+
+def open_shards(index_format, docs, inv):
+    """
+    按 create_rev_table.py --shards 切出的分片启动分片进程；没有分片、分片与当前索引不符
+    或有尚未压缩的增量更新时打印原因并返回 None，调用方继续用单一索引
+    """
+    manifest = index_shards.load_manifest()
+    stats = load_stats(STATS_PATH)
+    if manifest is None:
+        reason = "没有分片，请用 create_rev_table.py --shards N 构建"
+    elif has_updates(stats):
+        reason = "有尚未压缩的增量更新，分片中没有这些文档"
+    elif manifest["format"] != index_format or manifest["total_docs"] != len(docs):
+        reason = "分片与当前索引不一致，请重新构建"
+    else:
+        return ShardCoordinator(manifest, doc_dates(docs, inv))
+    print(f"不使用分片：{reason}")
+    return None
+
+def search(docs, inv, term_dict, highlighter, query, exhaustive=False, k=TOPK, cache=None,
+           proximity=False):
+    with tracing.record("search", query=query):
+        if cache is None:
+            ranked = rank_query(inv, parse_query(term_dict, query), exhaustive, k, proximity,
+                                doc_dates(docs, inv))
+            return render_results(docs, highlighter, ranked)
+
+        start = time.perf_counter()
+        raw = (" ".join(query.split()), exhaustive, k, proximity)
+        key = cache.lookup_key(raw)
+        if key is None:
+            parsed = parse_query(term_dict, query)
+            tokens, author_terms, keyword_terms, condition, expansions = parsed
+            key = (tuple(tokens), tuple(sorted(author_terms)), tuple(sorted(keyword_terms)), condition,
+                   expansions,
+                   (TITLE_WEIGHT, ABSTRACT_WEIGHT, AUTHOR_WEIGHT, KEYWORD_WEIGHT, PROXIMITY_WEIGHT,
+                    EXPANSION_WEIGHT),
+                   k, exhaustive, proximity)
+            cache.remember_key(raw, key)
+        results = cache.get(key)
+        hit = results is not None
+        tracing.count("cache_hit" if hit else "cache_miss")
+        if not hit:
+            ranked = rank_query(inv, (list(key[0]), set(key[1]), set(key[2]), key[3], key[4]),
+                                exhaustive, k, proximity, doc_dates(docs, inv))
+            results = render_results(docs, highlighter, ranked)
+            cache.put(key, results)
+        cache.record(hit, time.perf_counter() - start)
+        return results
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def render_pool():
+    """RENDER_WORKERS 大于0时返回共享的渲染线程池（第一次用到时创建），否则返回 None"""
+    global _render_pool
+    if RENDER_WORKERS <= 0:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+    return _render_pool
+
+def render_results(docs, highlighter, ranked):
+    with tracing.span("render"):
+        # 按索引时保存的分词结果高亮，同一文档同一命中集合直接取缓存
+        rendered = highlighter.render_many([(doc_id, hit_list) for doc_id, _, hit_list in ranked],
+                                           render_pool())
+        results = []
+        for (doc_id, score, _), (title, snippet, authors, keywords) in zip(ranked, rendered):
+            doc = docs[doc_id]
+            results.append({
+                "score": score,
+                "title": title,
+                "snippet": snippet,
+                "url": doc.get("url", ""),
+                "date": doc.get("date", ""),
+                "author": list(authors),
+                "keyword": list(keywords)
+            })
+        return results
+
+def get_feedback():
     """获取多行评价内容"""
     print("\n请对本次搜索进行评价（连续两次Enter结束）：")
     lines = []
@@ -130,36 +518,56 @@ def get_feedback(last_query, last_results):
         if line == "":
             break
         lines.append(line)
-    feedback = "\n".join(lines)
-    
-    # 构建日志内容
-    log_content = []
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_content.append(f"[评价时间] {timestamp}")
-    log_content.append(f"搜索词: {last_query}")
-    
-    if last_results:
-        log_content.append(f"\nTop{len(last_results)} 搜索结果：")
-        for idx, r in enumerate(last_results, 1):
-            log_content.append(f"{idx}. 相关度: {r['score']:.2f}\n")
-            log_content.append(f"   标题: {r['title']}\n")
-            log_content.append(f"   作者: {' '.join(r['author'])}\n")
-            log_content.append(f"   摘要: {r['snippet']}\n")
-            log_content.append(f"   关键词: {' '.join(r['keyword'])}\n")
-            log_content.append(f"   URL: {r['url']}\n")
-            log_content.append(f"   日期: {r['date']}\n\n")
-    else:
-        log_content.append("未找到相关内容。")
-    
-    log_content.append(f"用户评价：\n{feedback}")
-    log_content.append("-" * 50)
-    
-    return "\n".join(log_content)
+    return "\n".join(lines)
+
+def profile_startup(index_format, sample_query):
+    """分阶段统计从启动到第一个查询返回结果的耗时"""
+    profile = StartupProfile()
+    docs, inv, term_dict, highlighter = load_data(index_format, profile)
+    init_jieba()
+    profile.mark("jieba 词典")
+    results = search(docs, inv, term_dict, highlighter, sample_query)
+    profile.mark("首个查询")
+    print(profile.report())
+    print(f"查询「{sample_query}」返回 {len(results)} 条结果")
 
 def main():
+    parser = argparse.ArgumentParser(description="论文检索")
+    parser.add_argument("--format", choices=("json", "bin"), default="json",
+                        help="索引文件格式：json 读 re_idx.json，bin 读 re_idx.bin")
+    parser.add_argument("--profile-startup", nargs="?", const="信息检索", metavar="QUERY",
+                        help="统计启动各阶段和第一个查询的耗时后退出")
+    parser.add_argument("--persist-cache", action="store_true",
+                        help=f"查询结果缓存保存到 {CACHE_PATH}，下次启动时索引未变则继续使用")
+    parser.add_argument("--proximity", action="store_true",
+                        help="查询词在标题/摘要中挨得越近得分越高")
+    parser.add_argument("--trace", nargs="?", const="", metavar="JSONL",
+                        help="记录每次查询各阶段耗时和倒排记录/候选文档数，退出时打印汇总；给出文件名时逐条追加 JSON")
+    parser.add_argument("--shards", action="store_true",
+                        help="使用 create_rev_table.py --shards 切出的分片，每个分片一个进程并行计分")
+    args = parser.parse_args()
+
+    if args.trace is not None:
+        tracing.enable(args.trace or None)
+
+    if args.profile_startup:
+        profile_startup(args.format, args.profile_startup)
+        if args.trace is not None:
+            print(tracing.summary())
+        return
+
+    import pyreadline   # 历史命令和箭头上下切换，只有交互模式需要
+
     print("加载数据…")
-    docs, inv = load_data()
-    print("查询程序启动，输入 exit 退出，输入 rate 进行评价")
+    cache = open_cache(args.format, CACHE_PATH if args.persist_cache else None)
+    docs, inv, term_dict, highlighter = load_data(args.format)
+    shards = open_shards(args.format, docs, inv) if args.shards else None
+    if shards is not None:
+        inv = shards
+        print(f"已启动 {len(shards.pools)} 个分片进程")
+    feedback_writer = FeedbackWriter(LOG_PATH, FEEDBACK_JSONL_PATH)
+    print("查询程序启动，输入 exit 退出，输入 rate 进行评价，输入 cache 查看缓存命中情况；"
+          "用引号括起的词须作为短语连续出现，支持 AND/OR/NOT 和 author:/keyword:/title:/abstract:/date: 前缀")
 
     last_query = None
     last_results = None
@@ -167,21 +575,31 @@ def main():
     while True:
         user_input = input("\n请输入查询/命令：").strip()
         if user_input.lower() == "exit":
+            cache.save()
+            feedback_writer.close()
+            if shards is not None:
+                shards.close()
+            if args.trace is not None:
+                print(tracing.summary())
             print("拜拜！")
             break
+        elif user_input.lower() == "cache":
+            st = cache.stats()
+            print(f"缓存 {st['entries']} 条，查询 {st['lookups']} 次，命中率 {st['hit_rate']:.1%}，"
+                  f"命中平均 {st['avg_hit_ms']:.2f}ms，未命中平均 {st['avg_miss_ms']:.2f}ms")
         elif user_input.lower() == "rate":
             if last_query is None:
                 print("尚未进行过搜索")
                 continue
                 
-            feedback_log = get_feedback(last_query, last_results)
-            with open(LOG_PATH, "a", encoding="utf-8") as f:
-                f.write(feedback_log + "\n")
+            # 后台线程写日志，提示符立即返回
+            feedback_writer.submit(last_query, last_results, get_feedback())
             print("感谢评价！")
         else:
             # 执行搜索并记录状态
             last_query = user_input
-            last_results = search(docs, inv, user_input)
+            last_results = search(docs, inv, term_dict, highlighter, user_input, cache=cache,
+                                  proximity=args.proximity)
             
             if not last_results:
                 print("未找到相关内容。")
@@ -195,6 +613,11 @@ def main():
                     print(f"   关键词: {' '.join(r['keyword'])}")
                     print(f"   URL: {r['url']}")
                     print(f"   日期: {r['date']}\n")
+            if args.trace is not None:
+                rec = tracing.last_record()
+                stages = "  ".join(f"{name} {ms:.2f}ms" for name, ms in rec["spans"].items())
+                counters = "  ".join(f"{name} {n}" for name, n in rec["counters"].items())
+                print(f"[trace] 合计 {rec['total_ms']:.2f}ms  {stages}  {counters}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# query_cache.py
+# -*- coding: utf-8 -*-
+
+"""
+查询结果缓存
+
+键为查询分词后的词序列、作者/关键词集合、各字段权重、k 和计分方式，值为 search 的返回结果。
+词序列保留顺序：得分按词的顺序累加，顺序不同时浮点结果可能差最后一位。
+另有一层 原始查询串 -> 键 的小缓存，重复的查询串连分词都省掉。
+
+LRU 淘汰，条目超过 ttl 秒过期；可以保存到文件，下次启动时若索引版本相同则继续使用。
+索引版本由启动时的 index_stats.json 和主索引文件的签名算出，create_rev_table.py 的
+全量构建、增量更新和压缩都会重写这些文件，版本随之变化，旧缓存自动作废。
+"""
+
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+def _copy_results(results):
+    """search 的结果是字典列表，作者/关键词为列表，复制到这一层即可互不影响"""
+    return [dict(r, author=list(r["author"]), keyword=list(r["keyword"])) for r in results]
+
+class QueryCache:
+    def __init__(self, version, max_size=1024, ttl=3600, path=None):
+        self.version = version
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()       # 规范化查询串 -> 键
+        self._results = OrderedDict()    # 键 -> (写入时间, 结果)
+        self.hits = self.misses = 0
+        self.hit_time = self.miss_time = 0.0
+        if path:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if data.get("version") != self.version:
+            return
+        now = time.time()
+        for key, (created, results) in data["results"]:
+            if now - created < self.ttl:
+                self._results[key] = (created, results)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def save(self):
+        """保存到 path（未设置 path 时不保存）"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"version": self.version, "results": list(self._results.items())}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def lookup_key(self, raw):
+        with self._lock:
+            key = self._keys.get(raw)
+            if key is not None:
+                self._keys.move_to_end(raw)
+            return key
+
+    def remember_key(self, raw, key):
+        with self._lock:
+            self._keys[raw] = key
+            self._keys.move_to_end(raw)
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+
+    def get(self, key):
+        """命中返回结果的副本，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            created, results = entry
+            if time.time() - created >= self.ttl:
+                del self._results[key]
+                return None
+            self._results.move_to_end(key)
+        return _copy_results(results)
+
+    def put(self, key, results):
+        with self._lock:
+            self._results[key] = (time.time(), _copy_results(results))
+            self._results.move_to_end(key)
+            if len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def record(self, hit, elapsed):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_time += elapsed
+            else:
+                self.misses += 1
+                self.miss_time += elapsed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._results),
+                "lookups": lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_ms": self.hit_time / self.hits * 1000 if self.hits else 0.0,
+                "avg_miss_ms": self.miss_time / self.misses * 1000 if self.misses else 0.0,
+            }
@@ -0,0 +1,167 @@
+# server.py
+# -*- coding: utf-8 -*-
+
+"""
+常驻检索服务：启动时加载一次索引，之后通过 HTTP 返回 JSON
+
+    GET  /search?q=查询串&k=10      返回 {"query", "k", "results": [...]}，结果字段与 query.search 相同；
+                                  加 prox=1 按查询词的邻近度加分，查询串中引号括起的部分为短语
+    GET  /stats                    查询结果缓存的命中率和延迟
+    POST /rate  {"q": 查询串, "k": 10, "prox": false, "feedback": 评价}
+                                  按同样的查询重新检索，向 feedback.log/feedback.jsonl 追加与交互模式相同的评价记录
+
+请求由固定大小的线程池处理，所有线程共享同一份只读索引；评价日志交给后台线程批量写入，不阻塞请求。
+keep-alive 连接在处理期间一直占用一个线程，空闲或过慢超过 REQUEST_TIMEOUT 秒即断开，让出线程。
+检索出错时记录异常并返回 500。
+加 --shards 时索引按 create_rev_table.py --shards 切出的分片由各自的进程计分，每个查询同时发给所有分片。
+"""
+
+import argparse
+import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import query
+
+MAX_K = 100
+REQUEST_TIMEOUT = 10    # 连接上等待下一个请求（或读请求）的最长秒数
+
+class PooledHTTPServer(ThreadingMixIn, HTTPServer):
+    """每个连接交给线程池处理，而不是像 ThreadingHTTPServer 那样每次新建线程"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, threads):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="search")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+class SearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # 支持 keep-alive，压测客户端可复用连接
+    # 响应头和正文分两次写出，开着 Nagle 算法会和客户端的延迟确认叠加，每个请求多等约 40ms
+    disable_nagle_algorithm = True
+    timeout = REQUEST_TIMEOUT
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _search(self, q, k, proximity=False):
+        """返回检索结果；出错时打印异常并回复 500，返回 None"""
+        state = self.server.state
+        try:
+            return query.search(state["docs"], state["inv"], state["term_dict"],
+                                state["highlighter"], q, k=k, cache=self.server.cache,
+                                proximity=proximity)
+        except Exception:
+            traceback.print_exc()
+            self._send_json(500, {"error": "检索出错"})
+            return None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self._send_json(200, self.server.cache.stats())
+            return
+        if url.path != "/search":
+            self._send_json(404, {"error": "未知路径"})
+            return
+        params = parse_qs(url.query)
+        q = params.get("q", [""])[0].strip()
+        if not q:
+            self._send_json(400, {"error": "缺少查询参数 q"})
+            return
+        try:
+            k = parse_k(params.get("k", [query.TOPK])[0])
+        except ValueError:
+            self._send_json(400, {"error": "k 必须是正整数"})
+            return
+        proximity = params.get("prox", ["0"])[0] not in ("", "0", "false")
+        results = self._search(q, k, proximity)
+        if results is not None:
+            self._send_json(200, {"query": q, "k": k, "results": results})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/rate":
+            self._send_json(404, {"error": "未知路径"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            q = str(body.get("q", "")).strip()
+            k = parse_k(body.get("k", query.TOPK))
+        except (AttributeError, TypeError, ValueError):
+            self._send_json(400, {"error": "请求体必须是 JSON，k 必须是正整数"})
+            return
+        if not q:
+            self._send_json(400, {"error": "缺少查询串 q"})
+            return
+        results = self._search(q, k, bool(body.get("prox", False)))
+        if results is None:
+            return
+        self.server.feedback_writer.submit(q, results, str(body.get("feedback", "")))
+        self._send_json(200, {"ok": True})
+
+def parse_k(value):
+    k = int(value)
+    if k <= 0:
+        raise ValueError(value)
+    return min(k, MAX_K)
+
+def main():
+    parser = argparse.ArgumentParser(description="论文检索服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--format", choices=("json", "bin"), default="json",
+                        help="索引文件格式：json 读 re_idx.json，bin 读 re_idx.bin")
+    parser.add_argument("--threads", type=int, default=8, help="处理请求的线程数")
+    parser.add_argument("--persist-cache", action="store_true",
+                        help=f"查询结果缓存保存到 {query.CACHE_PATH}，下次启动时索引未变则继续使用")
+    parser.add_argument("--shards", action="store_true",
+                        help="使用 create_rev_table.py --shards 切出的分片，每个分片一个进程并行计分")
+    args = parser.parse_args()
+
+    print("加载数据…")
+    cache = query.open_cache(args.format, query.CACHE_PATH if args.persist_cache else None)
+    docs, inv, term_dict, highlighter = query.load_data(args.format)
+    query.init_jieba()
+    # 分片进程在请求线程启动之前创建
+    shards = query.open_shards(args.format, docs, inv) if args.shards else None
+    if shards is not None:
+        inv = shards
+        print(f"已启动 {len(shards.pools)} 个分片进程")
+
+    server = PooledHTTPServer((args.host, args.port), SearchHandler, args.threads)
+    server.state = {"docs": docs, "inv": inv, "term_dict": term_dict, "highlighter": highlighter}
+    server.feedback_writer = query.FeedbackWriter(query.LOG_PATH, query.FEEDBACK_JSONL_PATH)
+    server.cache = cache
+    print(f"检索服务已启动：http://{args.host}:{args.port}/search?q=…，Ctrl+C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("拜拜！")
+    finally:
+        server.server_close()
+        cache.save()
+        server.feedback_writer.close()
+        if shards is not None:
+            shards.close()
+
+if __name__ == "__main__":
+    main()
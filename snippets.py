@@ -0,0 +1,120 @@
+# snippets.py
+# -*- coding: utf-8 -*-
+
+"""
+结果高亮与摘要片段
+
+create_rev_table.py 把每篇文档标题/摘要的 jieba 分词结果按词长保存到 doc_tokens.json
+（分词结果首尾相接覆盖全文，词长的前缀和就是每个词的起止位置），
+查询时据此切分原文做高亮，不再重新分词；摘要只截取命中最密集的一段。
+渲染结果按 (文档号, 命中集合) 做 LRU 缓存，切分好的标题/摘要词序列按文档号另做 LRU 缓存，
+同一文档换一组命中词时不必重新切分。render_many 可以把一批结果交给线程池渲染。
+"""
+
+import json
+from functools import lru_cache
+
+ELLIPSIS = "…"
+
+def save_doc_tokens(token_lengths, path):
+    """token_lengths: [[标题各词长度], [摘要各词长度]] 的列表，每篇文档一项"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(token_lengths, f, separators=(",", ":"))
+
+def load_doc_tokens(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def split_by_lengths(text, lengths):
+    if not lengths:
+        # 空白文本不分词，整体作为一个词
+        return [text] if text else []
+    tokens = []
+    start = 0
+    for n in lengths:
+        tokens.append(text[start:start + n])
+        start += n
+    return tokens
+
+def mark(tokens, terms):
+    return [f'【{t}】' if t in terms else t for t in tokens]
+
+def densest_window(hit_idx, n_tokens, width):
+    """在 n_tokens 个词中选一段不超过 width 个词的窗口，使其覆盖的命中最多，返回 [start, end)"""
+    if n_tokens <= width:
+        return 0, n_tokens
+    if not hit_idx:
+        return 0, width
+    best_i, best_j = 0, 0
+    i = 0
+    for j in range(len(hit_idx)):
+        while hit_idx[j] - hit_idx[i] >= width:
+            i += 1
+        if j - i > best_j - best_i:
+            best_i, best_j = i, j
+    # 命中簇居中，两侧补上下文
+    first, last = hit_idx[best_i], hit_idx[best_j]
+    start = max(0, first - (width - (last - first + 1)) // 2)
+    start = min(start, n_tokens - width)
+    return start, start + width
+
+class Highlighter:
+    """
+    渲染检索结果的标题、摘要片段、作者和关键词
+
+    doc_tokens 缺失（旧索引）或与文档数不一致时退回到 jieba 分词，分词结果同样缓存。
+    """
+
+    def __init__(self, docs, doc_tokens=None, window=20, cache_size=1024):
+        self.docs = docs
+        self.doc_tokens = doc_tokens if doc_tokens is not None and len(doc_tokens) == len(docs) else None
+        self.width = 2 * window
+        self._render = lru_cache(maxsize=cache_size)(self._render_uncached)
+        self._segment = lru_cache(maxsize=cache_size)(self._segment_uncached)
+        self._tokens = lru_cache(maxsize=cache_size)(self._tokens_uncached)
+
+    def _segment_uncached(self, doc_id):
+        import jieba
+        doc = self.docs[doc_id]
+        return tuple([len(t) for t in jieba.cut(doc.get(field, ""))] for field in ("title", "abstract"))
+
+    def _tokens_uncached(self, doc_id):
+        if self.doc_tokens is not None:
+            title_lengths, abstract_lengths = self.doc_tokens[doc_id]
+        else:
+            title_lengths, abstract_lengths = self._segment(doc_id)
+        doc = self.docs[doc_id]
+        return (split_by_lengths(doc.get("title", ""), title_lengths),
+                split_by_lengths(doc.get("abstract", ""), abstract_lengths))
+
+    def render(self, doc_id, hit_list):
+        """返回 (标题, 摘要片段, 作者列表, 关键词列表)，命中部分用【】标出"""
+        return self._render(doc_id, frozenset(hit_list))
+
+    def render_many(self, items, executor=None):
+        """items 为 [(文档号, 命中列表), ...]，按顺序返回 render 的结果；给出 executor 时在其中并行渲染"""
+        if executor is None or len(items) <= 1:
+            return [self.render(doc_id, hit_list) for doc_id, hit_list in items]
+        return list(executor.map(lambda item: self.render(*item), items))
+
+    def _render_uncached(self, doc_id, hits):
+        doc = self.docs[doc_id]
+        title_terms = {term for (field, term) in hits if field == 'title'}
+        abstract_terms = {term for (field, term) in hits if field == 'abstract'}
+        author_terms = {term for (field, term) in hits if field == 'author'}
+        keyword_terms = {term for (field, term) in hits if field == 'keyword'}
+
+        title_tokens, abstract_tokens = self._tokens(doc_id)
+        title = ''.join(mark(title_tokens, title_terms))
+
+        hit_idx = [i for i, t in enumerate(abstract_tokens) if t in abstract_terms]
+        start, end = densest_window(hit_idx, len(abstract_tokens), self.width)
+        snippet = ''.join(mark(abstract_tokens[start:end], abstract_terms))
+        if start > 0:
+            snippet = ELLIPSIS + snippet
+        if end < len(abstract_tokens):
+            snippet += ELLIPSIS
+
+        authors = tuple(f'【{a}】' if a in author_terms else a for a in doc.get("author", []))
+        keywords = tuple(f'【{kw}】' if kw in keyword_terms else kw for kw in doc.get("keyword", []))
+        return title, snippet, authors, keywords
@@ -0,0 +1,127 @@
+# startup_cache.py
+# -*- coding: utf-8 -*-
+
+"""
+启动缓存：jieba 前缀词典缓存与索引快照
+
+jieba 自带的词典缓存是 marshal 格式，载入约要 1.4s，和重新构建差不多；
+这里把构建好的前缀词典 pickle 到项目目录下的 jieba_dict.pkl，载入约 0.4s。
+
+index_snapshot.pkl 保存解析好的文档、紧凑倒排索引 PackedIndex（仅 json 格式）、分词词长和作者/关键词自动机。
+文件头记录生成快照时各源文件的大小和修改时间，任一源文件变化后快照即失效，
+由 query.py 重新读取源文件并重写快照。
+"""
+
+import gc
+import logging
+import os
+import pickle
+import tempfile
+import threading
+
+JIEBA_DICT_CACHE = "jieba_dict.pkl"
+SNAPSHOT_PATH = "index_snapshot.pkl"
+SNAPSHOT_VERSION = 2
+
+# 索引相关文件：create_rev_table.py/stream_build.py 写出，query.py 读取
+DOCS_PATH = "papers.json"
+INDEX_PATH = "re_idx.json"
+BIN_INDEX_PATH = "re_idx.bin"
+TERM_DICT_PATH = "term_dict.json"
+DOC_TOKENS_PATH = "doc_tokens.json"
+TERM_EXPAND_PATH = "term_expand.json"
+
+_jieba = None
+_jieba_lock = threading.Lock()
+
+def _write_pickles(path, *objs):
+    """依次 pickle 多个对象，写临时文件后替换（多个进程/线程同时写也不会留下半个文件）"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        for obj in objs:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def snapshot_sources(index_format):
+    """快照依赖的源文件（二进制索引查询时直接 mmap，不进快照）"""
+    return [DOCS_PATH] + ([INDEX_PATH] if index_format == "json" else []) + [DOC_TOKENS_PATH, TERM_DICT_PATH]
+
+def source_signature(paths):
+    sig = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            sig[path] = None
+            continue
+        sig[path] = [st.st_size, st.st_mtime_ns]
+    return sig
+
+def _jieba_dict_key(jieba):
+    dict_path = os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+    return {"jieba": jieba.__version__, "dict": source_signature([dict_path])}
+
+def init_jieba(cache_path=JIEBA_DICT_CACHE):
+    """
+    导入并初始化 jieba，返回 jieba 模块；只在第一次调用时真正导入。
+    使用默认词典时从 cache_path 载入前缀词典，缓存缺失或过期就正常初始化后重写缓存。
+    """
+    global _jieba
+    if _jieba is not None:
+        return _jieba
+    with _jieba_lock:
+        if _jieba is not None:
+            return _jieba
+        import jieba
+        logging.getLogger("jieba").setLevel(logging.ERROR)
+        dt = jieba.dt
+        with dt.lock:
+            if not dt.initialized and dt.dictionary is None:
+                key = _jieba_dict_key(jieba)
+                cached = _load_pickles(cache_path, key)
+                if cached is not None:
+                    dt.FREQ, dt.total = cached
+                    dt.initialized = True
+                else:
+                    dt.initialize()
+                    try:
+                        _write_pickles(cache_path, key, (dt.FREQ, dt.total))
+                    except OSError:
+                        pass
+        dt.check_initialized()
+        _jieba = jieba
+    return _jieba
+
+def _load_pickles(path, key):
+    """文件头与 key 一致时返回其后的对象，否则返回 None"""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    # 反序列化大量小对象时循环垃圾回收会被反复触发，载入期间暂停；
+    # 载入的数据常驻到进程结束，移入永久代，之后的垃圾回收不再扫描它们
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with f:
+            if pickle.load(f) != key:
+                return None
+            obj = pickle.load(f)
+        gc.freeze()
+        return obj
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def snapshot_key(index_format, paths):
+    return {"version": SNAPSHOT_VERSION, "format": index_format, "sources": source_signature(paths)}
+
+def load_snapshot(key, path=SNAPSHOT_PATH):
+    """返回 {"docs", "inv", "doc_tokens", "term_dict"}；快照不存在或已过期返回 None"""
+    return _load_pickles(path, key)
+
+def save_snapshot(key, docs, inv, doc_tokens, term_dict, path=SNAPSHOT_PATH):
+    """key 须在读取（或写完）源文件时取得，保证快照内容与其中记录的源文件一致"""
+    _write_pickles(path, key, {"docs": docs, "inv": inv, "doc_tokens": doc_tokens, "term_dict": term_dict})
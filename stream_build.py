@@ -0,0 +1,246 @@
+# stream_build.py
+# -*- coding: utf-8 -*-
+
+"""
+流式构建倒排索引（SPIMI）：内存占用由预算而不是语料规模决定
+
+1. 逐篇读取 papers.json（JSON 数组或 JSONL），累计到内存预算就分词成一批，
+   把这批文档的倒排记录按词排序写成一个临时 run 文件，分词词长直接追加到 doc_tokens.json，
+   查询扩展用的关键词对计数也按批写成临时文件，生成扩展表时归并；
+2. 多路归并所有 run，逐词汇总 df/sum_tf/doc_tf_sum 并计算分数（常驻内存的只有词表级别的统计）；
+3. 再归并一次，为每条倒排记录填上分数，逐词写入临时文件，最后按词首次出现的顺序输出
+   re_idx.json（或按字节序输出 re_idx.bin）。
+
+输出文件与 create_rev_table.py 的全量构建逐字节相同。
+"""
+
+import heapq
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+from contextlib import nullcontext
+from itertools import groupby
+
+import numpy as np
+
+from bin_index import save_bin_index
+from create_rev_table import (doc_tf_contributions, iter_docs, save_index_stats, score_terms,
+                              segment_fields, segment_pool, write_raw_scores)
+from startup_cache import BIN_INDEX_PATH, DOC_TOKENS_PATH, INDEX_PATH, TERM_DICT_PATH, TERM_EXPAND_PATH
+from term_dict import save_term_dict
+from term_expand import ExpansionBuilder, save_expansion_table
+import tracing
+
+MEMORY_MB = 512
+# 一批文档占用内存的粗略估计：样例语料分词后的位置表约 84 字节/字（tracemalloc 测得），
+# 写 run 文件前按词重组的倒排记录再占用差不多一样多
+BYTES_PER_CHAR = 160
+BYTES_PER_DOC = 4096
+
+def _doc_cost(doc):
+    return BYTES_PER_DOC + BYTES_PER_CHAR * (len(doc.get("title", "")) + len(doc.get("abstract", "")))
+
+def iter_batches(docs, memory_mb=MEMORY_MB):
+    """按估计内存把文档流切成批，每批至少一篇"""
+    budget = memory_mb * 1024 * 1024
+    batch, cost = [], 0
+    for doc in docs:
+        c = _doc_cost(doc)
+        if batch and cost + c > budget:
+            yield batch
+            batch, cost = [], 0
+        batch.append(doc)
+        cost += c
+    if batch:
+        yield batch
+
+def _spill_run(tpos, apos, upos, kpos, first_doc_id, path):
+    """
+    把一批文档的倒排记录按词排序写成 run 文件，每行：
+    [词, 首次出现, 在标题/摘要中首次出现, [[文档号, 标题位置, 摘要位置, 作者位置, 关键词位置, doc_tf], ...]]
+    首次出现记为 [文档号, 字段序号, 在该字段位置表中的序号]，决定最终索引和统计中词的顺序
+    """
+    entries = {}
+    for i, pos_maps in enumerate(zip(tpos, apos, upos, kpos)):
+        doc_id = first_doc_id + i
+        for f, pos_map in enumerate(pos_maps):
+            for rank, (term, poses) in enumerate(pos_map.items()):
+                e = entries.get(term)
+                if e is None:
+                    e = entries[term] = [[doc_id, f, rank], None, {}]
+                if f < 2 and e[1] is None:
+                    e[1] = [doc_id, f, rank]
+                p = e[2].get(doc_id)
+                if p is None:
+                    p = e[2][doc_id] = [doc_id, [], [], [], [], None]
+                p[1 + f] = poses
+        for term, _, doc_tf in doc_tf_contributions(pos_maps[0], pos_maps[1]):
+            entries[term][2][doc_id][5] = doc_tf
+
+    with open(path, "w", encoding="utf-8") as f:
+        for term in sorted(entries):
+            first, first_text, postings = entries[term]
+            f.write(json.dumps([term, first, first_text, list(postings.values())],
+                               ensure_ascii=False, separators=(",", ":")) + "\n")
+
+def _read_run(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def merge_runs(paths):
+    """多路归并，按词序产出 (词, 首次出现, 在标题/摘要中首次出现, 按文档号排列的倒排记录)"""
+    merged = heapq.merge(*(_read_run(p) for p in paths), key=lambda row: row[0])
+    for term, rows in groupby(merged, key=lambda row: row[0]):
+        rows = list(rows)
+        first = min(row[1] for row in rows)
+        texts = [row[2] for row in rows if row[2] is not None]
+        postings = [p for row in rows for p in row[3]]
+        yield term, first, min(texts) if texts else None, postings
+
+def _doc_tf_sum(postings):
+    """按 df 集合（文档号升序依次加入的 set）的遍历顺序累加，与 term_statistics 逐位相同"""
+    doc_tf = {p[0]: p[5] for p in postings if p[5] is not None}
+    # 逐个 add，不能用 set(dict)：那样会预先扩容，遍历顺序不同
+    df_set = set()
+    for doc_id in doc_tf:
+        df_set.add(doc_id)
+    total = 0.0
+    for doc_id in df_set:
+        total += doc_tf[doc_id]
+    return total
+
+class SpilledIndex(Mapping):
+    """逐词写在临时文件里的倒排索引，按词首次出现的顺序遍历，取值时才读入该词的倒排记录"""
+
+    def __init__(self, path, offsets):
+        self._file = open(path, "rb")
+        self._offsets = offsets
+
+    def close(self):
+        self._file.close()
+
+    def __getitem__(self, term):
+        start, end = self._offsets[term]
+        self._file.seek(start)
+        return {int(d): fields for d, fields in json.loads(self._file.read(end - start)).items()}
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+def write_index_json(index, path):
+    """与 json.dump(inv, f, ensure_ascii=False, indent=2) 输出相同，但一次只序列化一个词"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("{")
+        for n, term in enumerate(index):
+            body = json.dumps(index[term], ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            f.write(("," if n else "") + f"\n  {json.dumps(term, ensure_ascii=False)}: {body}")
+        f.write("\n}" if len(index) else "}")
+    os.replace(tmp, path)
+
+def build_streaming(docs_path, index_format="json", memory_mb=MEMORY_MB, workers=1, tmp_dir=None):
+    """流式全量构建，写出与 create_rev_table.py 全量构建相同的全部文件，返回文档数"""
+    work = tempfile.mkdtemp(prefix="spimi_", dir=tmp_dir)
+    tokens_tmp = None
+    try:
+        # —— 第一步：分批分词，写 run 文件和分词词长
+        runs = []
+        authors, keywords = set(), set()
+        expansion = ExpansionBuilder()
+        total_docs = 0
+        fd, tokens_tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(DOC_TOKENS_PATH)), suffix=".tmp")
+        # 各批共用一个分词进程池，不必每批重启子进程、重新加载 jieba 词典
+        with os.fdopen(fd, "w", encoding="utf-8") as tokens_out, \
+                (segment_pool(workers) if workers > 1 else nullcontext()) as pool:
+            tokens_out.write("[")
+            for batch in iter_batches(iter_docs(docs_path), memory_mb):
+                with tracing.span("segment_fields"):
+                    _, tpos, apos, upos, kpos, token_lengths = segment_fields(batch, workers=workers,
+                                                                              pool=pool)
+                path = os.path.join(work, f"run_{len(runs):05d}.jsonl")
+                with tracing.span("spill_run"):
+                    _spill_run(tpos, apos, upos, kpos, total_docs, path)
+                runs.append(path)
+                for lengths in token_lengths:
+                    tokens_out.write(("," if total_docs else "")
+                                     + json.dumps(lengths, separators=(",", ":")))
+                    total_docs += 1
+                for auth_map in upos:
+                    authors.update(auth_map)
+                for keyword_map in kpos:
+                    keywords.update(keyword_map)
+                expansion.add_docs(upos, kpos)
+                expansion.spill_pairs(os.path.join(work, f"pairs_{len(runs) - 1:05d}.jsonl"))
+                print(f"已分词 {total_docs} 篇，run 文件 {len(runs)} 个")
+                del tpos, apos, upos, kpos, token_lengths
+            tokens_out.write("]")
+
+        # —— 第二步：归并统计，计算各词分数
+        first_seen = {}
+        text_terms = []
+        with tracing.span("merge_stats"):
+            for term, first, first_text, postings in merge_runs(runs):
+                first_seen[term] = first
+                if first_text is not None:
+                    df = sum(1 for p in postings if p[5] is not None)
+                    sum_tf = sum(len(p[1]) + len(p[2]) for p in postings)
+                    text_terms.append((first_text, term, df, sum_tf, _doc_tf_sum(postings)))
+        text_terms.sort()
+        terms = [row[1] for row in text_terms]
+        df_counts = np.array([row[2] for row in text_terms], dtype=np.int64)
+        doc_tf_sum = np.array([row[4] for row in text_terms], dtype=float)
+        with tracing.span("score_terms"):
+            tf, idf, raw_score, final_score = score_terms(total_docs, df_counts, doc_tf_sum)
+        with tracing.span("write_raw_scores"):
+            write_raw_scores(terms, tf, idf, raw_score, final_score)
+        term_scores = dict(zip(terms, final_score))
+        term_stats = {row[1]: [row[2], row[3], row[4], score]
+                      for row, score in zip(text_terms, final_score)}
+        del text_terms
+
+        # —— 第三步：再归并一次，填上分数后逐词写入临时文件
+        postings_path = os.path.join(work, "postings.jsonl")
+        offsets = {}
+        with tracing.span("merge_postings"), open(postings_path, "wb") as out:
+            for term, _, _, postings in merge_runs(runs):
+                fields = {}
+                for p in postings:
+                    has_text = p[1] or p[2]
+                    fields[p[0]] = {"title_positions": p[1], "abstract_positions": p[2],
+                                    "author_positions": p[3], "keyword_positions": p[4],
+                                    "score": term_scores[term] if has_text else 1.0}
+                data = json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                offsets[term] = (out.tell(), out.tell() + len(data))
+                out.write(data)
+        # 最终索引中词按首次出现（先标题、摘要，再作者、关键词）排列，与全量构建相同
+        offsets = {term: offsets[term] for term in sorted(offsets, key=first_seen.__getitem__)}
+        del first_seen
+
+        index = SpilledIndex(postings_path, offsets)
+        try:
+            with tracing.span("save_index"):
+                if index_format == "bin":
+                    save_bin_index(index, BIN_INDEX_PATH, total_docs)
+                else:
+                    write_index_json(index, INDEX_PATH)
+        finally:
+            index.close()
+
+        with tracing.span("save_aux_files"):
+            save_term_dict(authors, keywords, TERM_DICT_PATH)
+            save_expansion_table(expansion.build(term_stats), TERM_EXPAND_PATH)
+            os.replace(tokens_tmp, DOC_TOKENS_PATH)
+            save_index_stats(term_stats, total_docs, index_format)
+        tracing.count("terms", len(terms))
+        return total_docs
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        # 出错时分词词长的临时文件还在数据目录里
+        if tokens_tmp is not None and os.path.exists(tokens_tmp):
+            os.remove(tokens_tmp)
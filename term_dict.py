@@ -0,0 +1,104 @@
+# term_dict.py
+# -*- coding: utf-8 -*-
+
+"""
+作者/关键词词典：用 Aho-Corasick 自动机在查询串上一次扫描找出所有包含的作者名和关键词
+"""
+
+import json
+from collections import deque
+
+def collect_terms(author_list, keyword_list):
+    """从各文档的作者/关键词位置表中收集全部作者名和关键词"""
+    authors, keywords = set(), set()
+    for auth_map in author_list:
+        authors.update(auth_map.keys())
+    for keyword_map in keyword_list:
+        keywords.update(keyword_map.keys())
+    return authors, keywords
+
+def collect_terms_from_index(inv):
+    """旧索引没有词典文件时，从倒排索引的 author/keyword_positions 中恢复"""
+    authors, keywords = set(), set()
+    for term, postings in inv.items():
+        for fields in postings.values():
+            if fields["author_positions"]:
+                authors.add(term)
+            if fields["keyword_positions"]:
+                keywords.add(term)
+    return authors, keywords
+
+def save_term_dict(authors, keywords, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"author": sorted(authors), "keyword": sorted(keywords)},
+                  f, ensure_ascii=False)
+
+def add_to_term_dict(authors, keywords, path):
+    """把新增文档的作者名/关键词并入已有的词典文件"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    save_term_dict(set(data["author"]) | set(authors), set(data["keyword"]) | set(keywords), path)
+
+def load_term_dict(path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return TermMatcher(data["author"], data["keyword"])
+
+class TermMatcher:
+    """作者名+关键词的 Aho-Corasick 自动机"""
+
+    def __init__(self, authors, keywords):
+        self.authors = set(authors)
+        self.keywords = set(keywords)
+        # goto[s]: 字符 -> 下一状态；fail[s]: 失配跳转；out[s]: 在状态 s 结束的词
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for term in self.authors | self.keywords:
+            if term:
+                self._insert(term)
+        self._build_fail()
+
+    def _insert(self, term):
+        s = 0
+        for ch in term:
+            nxt = self.goto[s].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[s][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            s = nxt
+        self.out[s].append(term)
+
+    def _build_fail(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self.goto[s].items():
+                queue.append(nxt)
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                # 合并失配链上的输出，匹配时无需再沿 fail 回溯
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_all(self, text):
+        """返回 text 中出现过的全部词（作为子串，含重叠）"""
+        found = set()
+        goto, fail, out = self.goto, self.fail, self.out
+        s = 0
+        for ch in text:
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                found.update(out[s])
+        return found
+
+    def match(self, text):
+        """一次扫描，分别返回 text 中包含的作者名集合和关键词集合"""
+        found = self.find_all(text)
+        return found & self.authors, found & self.keywords
@@ -0,0 +1,170 @@
+# term_expand.py
+# -*- coding: utf-8 -*-
+
+"""
+查询扩展表：查询词在索引中很少出现或根本没有时，补上相近的词
+
+查询串和摘要的分词结果不一致（如查询里切成“深度学习”，摘要里切成“深度”“学习”）时，
+原来的查询什么也找不到。构建索引时从语料中预先算出 term_expand.json：
+    terms / df      索引中全部词（标题/摘要词、作者名、关键词）及其文档频率
+    ngrams          字二元组 -> 含该二元组的标题/摘要词（按 df 降序，每组最多 NGRAM_LIST_SIZE 个）
+    cooccur         关键词 -> 与它在同一篇文档的关键词中一起出现最多的几个关键词
+文件中的词都用在 terms 中的序号表示。
+
+查询时只对低召回的查询扩展（各查询词 df 之和小于 min_docs）：
+df 小于 min_docs 的查询词按字二元组的 Dice 相似度找近似词，命中的关键词取共现关键词，
+每个词最多扩展 fanout 个，所有扩展词的 df 之和不超过 budget，高频词不会被扩展进来拖慢查询。
+扩展词只补召回：只由扩展词命中的文档排在原查询词命中的文档之后（见 query.rank_query）。
+增量更新不改这张表，压缩或重建索引时重新生成。
+"""
+
+import heapq
+import json
+from collections import Counter
+from itertools import groupby
+
+from index_segments import write_json_atomic
+
+NGRAM_LIST_SIZE = 64    # 每个字二元组保留的词数
+COOCCUR_SIZE = 5        # 每个关键词保留的共现关键词数
+MIN_SIMILARITY = 0.5    # 字二元组 Dice 相似度下限
+
+def bigrams(term):
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+class ExpansionBuilder:
+    """
+    逐批加入各文档的作者/关键词位置表（全量构建一次加入、流式构建分批加入），最后与词统计一起生成扩展表；
+    关键词对的计数随语料增长，流式构建每批用 spill_pairs 写到临时文件，生成时再归并
+    """
+
+    def __init__(self):
+        self.author_df = Counter()
+        self.keyword_df = Counter()
+        self.pairs = Counter()
+        self.pair_runs = []
+
+    def add_docs(self, author_list, keyword_list):
+        self.author_df.update(name for auth_map in author_list for name in auth_map)
+        for keyword_map in keyword_list:
+            keywords = sorted(keyword_map)
+            self.keyword_df.update(keywords)
+            for i, a in enumerate(keywords):
+                for b in keywords[i + 1:]:
+                    self.pairs[a, b] += 1
+
+    def spill_pairs(self, path):
+        """把当前的关键词对计数按词对排序写到 path（每行 [a, b, 次数]），清空内存中的计数"""
+        with open(path, "w", encoding="utf-8") as f:
+            for (a, b), n in sorted(self.pairs.items()):
+                f.write(json.dumps([a, b, n], ensure_ascii=False) + "\n")
+        self.pair_runs.append(path)
+        self.pairs = Counter()
+
+    def iter_pairs(self):
+        """归并各临时文件和内存中的计数，按词对顺序产出 (a, b, 次数)"""
+        sources = [_read_pairs(path) for path in self.pair_runs]
+        sources.append([a, b, n] for (a, b), n in sorted(self.pairs.items()))
+        merged = heapq.merge(*sources, key=lambda row: (row[0], row[1]))
+        for (a, b), rows in groupby(merged, key=lambda row: (row[0], row[1])):
+            yield a, b, sum(row[2] for row in rows)
+
+    def build(self, term_stats):
+        """term_stats 为 {词: [df, ...]}（标题/摘要词），返回可以写成 JSON 的扩展表"""
+        df = {term: row[0] for term, row in term_stats.items()}
+        for counter in (self.author_df, self.keyword_df):
+            for term, n in counter.items():
+                df[term] = max(df.get(term, 0), n)
+        terms = sorted(df)
+        ids = {term: i for i, term in enumerate(terms)}
+
+        ngrams = {}
+        for term in term_stats:
+            for gram in bigrams(term):
+                ngrams.setdefault(gram, []).append(ids[term])
+        for gram, members in ngrams.items():
+            members.sort(key=lambda i: (-df[terms[i]], i))
+            del members[NGRAM_LIST_SIZE:]
+
+        # 每个关键词只留共现最多的几个候选，内存与关键词数而不是词对数成正比
+        neighbors = {}
+        for a, b, n in self.iter_pairs():
+            for keyword, other in ((a, b), (b, a)):
+                items = neighbors.setdefault(keyword, [])
+                items.append((-n, other))
+                if len(items) > 2 * COOCCUR_SIZE:
+                    items.sort()
+                    del items[COOCCUR_SIZE:]
+        cooccur = {}
+        for keyword, items in neighbors.items():
+            items.sort()
+            cooccur[ids[keyword]] = [ids[b] for _, b in items[:COOCCUR_SIZE]]
+
+        return {"terms": terms, "df": [df[t] for t in terms],
+                "ngrams": dict(sorted(ngrams.items())),
+                "cooccur": [[i, cooccur[i]] for i in sorted(cooccur)]}
+
+def _read_pairs(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def save_expansion_table(table, path):
+    write_json_atomic(table, path, separators=(",", ":"))
+
+def load_expansion_table(path):
+    with open(path, encoding="utf-8") as f:
+        return ExpansionTable(json.load(f))
+
+class ExpansionTable:
+    def __init__(self, data):
+        self.terms = data["terms"]
+        self.df = dict(zip(self.terms, data["df"]))
+        self.ngrams = data["ngrams"]
+        self.cooccur = {i: members for i, members in data["cooccur"]}
+        self.ids = {term: i for i, term in enumerate(self.terms)}
+
+    def similar_terms(self, token):
+        """与 token 字二元组 Dice 相似度不低于 MIN_SIMILARITY 的标题/摘要词，按相似度、df 降序"""
+        grams = bigrams(token)
+        if not grams:
+            return []
+        shared = Counter(i for gram in grams for i in self.ngrams.get(gram, ()))
+        scored = []
+        for i, n in shared.items():
+            term = self.terms[i]
+            similarity = 2 * n / (len(grams) + len(bigrams(term)))
+            if similarity >= MIN_SIMILARITY and term != token:
+                scored.append((-similarity, -self.df[term], term))
+        return [term for _, _, term in sorted(scored)]
+
+    def cooccurring(self, keyword):
+        i = self.ids.get(keyword)
+        return [self.terms[j] for j in self.cooccur.get(i, ())]
+
+    def expand(self, tokens, author_terms, keyword_terms, min_docs, fanout, budget):
+        """
+        返回扩展词 ((词, 类型), ...)，类型为 "text"（按标题/摘要计分）或 "keyword"；
+        查询词 df 之和不小于 min_docs 时不扩展
+        """
+        query_terms = set(tokens) | set(author_terms) | set(keyword_terms)
+        if sum(self.df.get(t, 0) for t in query_terms) >= min_docs:
+            return ()
+        sources = [(t, "text", self.similar_terms) for t in dict.fromkeys(tokens)
+                   if self.df.get(t, 0) < min_docs]
+        sources += [(kw, "keyword", self.cooccurring) for kw in sorted(keyword_terms)]
+        expansions = []
+        seen = set(query_terms)
+        for term, kind, neighbors in sources:
+            added = 0
+            for candidate in neighbors(term):
+                if added == fanout:
+                    break
+                n = self.df.get(candidate, 0)
+                if candidate in seen or n > budget:
+                    continue
+                seen.add(candidate)
+                expansions.append((candidate, kind))
+                budget -= n
+                added += 1
+        return tuple(expansions)
@@ -0,0 +1,204 @@
+# topk.py
+# -*- coding: utf-8 -*-
+
+"""
+Top-K 检索：穷举计分、MaxScore 剪枝与向量化计分
+
+计分表 lists 为 [(词, 倒排记录, 字段, 上界), ...]，顺序即累加顺序；
+字段为 ((位置键, 权重, 命中标记), ...)，文档在该表上的得分为命中字段的 权重 × score 之和；
+上界不小于该表对任一文档的得分。两种方式都按 (得分降序, 文档号升序) 排序，结果相同。
+布尔查询先求出满足条件的文档，再用 rank_candidates 只对这些文档计分。
+向量化计分把倒排记录转成 NumPy 数组（posting_arrays），在稠密得分向量上散加，结果与穷举计分逐位相同。
+"""
+
+import heapq
+from bisect import bisect_left
+
+import numpy as np
+
+from phrase import sorted_doc_ids
+import tracing
+
+# 剪枝时为浮点累加顺序不同留出的余量
+EPS = 1e-9
+
+# 向量化计分时各字段在位掩码中的位；proximity 为邻近度加分的伪计分表
+FIELD_BITS = {"title_positions": 1, "abstract_positions": 2, "author_positions": 4,
+              "keyword_positions": 8, "proximity": 16}
+
+def exact_score(lists, doc_id):
+    """按计分表顺序逐字段累加，与穷举计分的加法顺序一致"""
+    score = 0.0
+    for _, postings, fields, _ in lists:
+        f = postings.get(doc_id)
+        if f is None:
+            continue
+        for key, weight, _ in fields:
+            if f[key]:
+                score += weight * f["score"]
+    return score
+
+def doc_hits(lists, doc_id):
+    hits = []
+    for term, postings, fields, _ in lists:
+        f = postings.get(doc_id)
+        if f is None:
+            continue
+        for key, _, label in fields:
+            if f[key]:
+                hits.append((label, term))
+    return hits
+
+def rank_exhaustive(lists, k):
+    """对所有倒排记录计分后排序，返回 [(文档号, 得分, 命中列表), ...]"""
+    scores = {}
+    hits = {}
+    for term, postings, fields, _ in lists:
+        for doc_id, f in postings.items():
+            for key, weight, label in fields:
+                if f[key]:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * f["score"]
+                    hits.setdefault(doc_id, []).append((label, term))
+    tracing.count("candidates", len(scores))
+    tracing.count("scored", len(scores))
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:k]
+    return [(doc_id, score, hits[doc_id]) for doc_id, score in ranked]
+
+def _contribution(postings, fields, doc_id):
+    f = postings.get(doc_id)
+    if f is None:
+        return 0.0
+    return sum(weight * f["score"] for key, weight, _ in fields if f[key])
+
+def rank_maxscore(lists, k):
+    """
+    MaxScore 剪枝：计分表按上界升序排列，上界前缀和低于当前第 k 名得分的表为非必要表。
+    只沿必要表的文档号升序枚举候选，非必要表在文档号表上从上次的位置二分查找，
+    得分加上剩余上界仍达不到第 k 名的文档提前放弃。文档号表用 sorted_doc_ids，紧凑索引不复制。
+    """
+    if k <= 0:
+        return []
+    lists_by_ub = sorted(lists, key=lambda x: x[3])
+    n = len(lists_by_ub)
+    postings = [x[1] for x in lists_by_ub]
+    fields = [x[2] for x in lists_by_ub]
+    docs = [sorted_doc_ids(p) for p in postings]
+    prefix = []
+    total = 0.0
+    for x in lists_by_ub:
+        total += x[3]
+        prefix.append(total)
+
+    ptr = [0] * n
+    heap = []            # (得分, -文档号)，堆顶为当前第 k 名
+    theta = float("-inf")
+    first_essential = 0
+    candidates = scored = 0
+
+    while True:
+        # 必要表中最小的当前文档号
+        doc_id = None
+        for j in range(first_essential, n):
+            if ptr[j] < len(docs[j]):
+                d = docs[j][ptr[j]]
+                if doc_id is None or d < doc_id:
+                    doc_id = d
+        if doc_id is None:
+            break
+        candidates += 1
+
+        partial = 0.0
+        for j in range(first_essential, n):
+            if ptr[j] < len(docs[j]) and docs[j][ptr[j]] == doc_id:
+                partial += _contribution(postings[j], fields[j], doc_id)
+                ptr[j] += 1
+
+        # 非必要表从上界大的开始补分，补不到 theta 就放弃
+        pruned = False
+        for j in range(first_essential - 1, -1, -1):
+            if partial + prefix[j] < theta - EPS:
+                pruned = True
+                break
+            # 候选文档号递增，指针只会前移
+            ptr[j] = bisect_left(docs[j], doc_id, ptr[j])
+            if ptr[j] < len(docs[j]) and docs[j][ptr[j]] == doc_id:
+                partial += _contribution(postings[j], fields[j], doc_id)
+        if pruned or partial <= 0:
+            continue
+
+        # 文档号递增枚举，后来的文档与堆中文档同分时排序靠后，只有严格更高才能进入
+        scored += 1
+        entry = (exact_score(lists, doc_id), -doc_id)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        else:
+            continue
+        if len(heap) == k:
+            theta = heap[0][0]
+            while first_essential < n and prefix[first_essential] < theta - EPS:
+                first_essential += 1
+
+    tracing.count("candidates", candidates)
+    tracing.count("scored", scored)
+    ranked = sorted(heap, key=lambda x: (-x[0], -x[1]))
+    return [(-neg_id, score, doc_hits(lists, -neg_id)) for score, neg_id in ranked]
+
+def rank_candidates(lists, candidates, k):
+    """
+    只对给定的候选文档计分（布尔查询过滤后的文档），工作量与候选数成正比。
+    没有命中任何计分表的候选得分为0，排在最后；排序规则与另外两种方式相同
+    """
+    if k <= 0:
+        return []
+    tracing.count("candidates", len(candidates))
+    tracing.count("scored", len(candidates))
+    scored = ((exact_score(lists, doc_id), doc_id) for doc_id in candidates)
+    ranked = heapq.nsmallest(k, scored, key=lambda x: (-x[0], x[1]))
+    return [(doc_id, score, doc_hits(lists, doc_id)) for score, doc_id in ranked]
+
+def posting_arrays(postings):
+    """倒排记录 -> (文档号, 字段位掩码, score) 三个等长的连续数组，顺序与倒排记录的迭代顺序相同"""
+    if hasattr(postings, "arrays"):
+        # PackedPostings 直接从紧凑索引的连续数组中切出
+        return postings.arrays()
+    n = len(postings)
+    ids = np.fromiter(postings, dtype=np.int64, count=n)
+    masks = np.fromiter(((1 if f["title_positions"] else 0) | (2 if f["abstract_positions"] else 0)
+                         | (4 if f["author_positions"] else 0) | (8 if f["keyword_positions"] else 0)
+                         for f in postings.values()), dtype=np.uint8, count=n)
+    scores = np.fromiter((f["score"] for f in postings.values()), dtype=np.float64, count=n)
+    return ids, masks, scores
+
+def rank_vectorized(lists, k, arrays=None):
+    """
+    向量化计分：按计分表、字段的顺序把 权重 × score 散加到稠密得分向量（长度为最大文档号 + 1），
+    每个文档的加法顺序与 exact_score 相同，得分逐位一致；再用 argpartition 取前 k 名，
+    与第 k 名同分的文档全部保留后按 (得分降序, 文档号升序) 排序。命中列表只为最终的 k 篇文档重建。
+    arrays 与 lists 一一对应，为 posting_arrays 的结果（可预先缓存），为 None 的项现场转换
+    """
+    if k <= 0:
+        return []
+    arrays = [a if a is not None else posting_arrays(x[1])
+              for a, x in zip(arrays or [None] * len(lists), lists)]
+    n = max((int(ids.max()) + 1 for ids, _, _ in arrays if len(ids)), default=0)
+    scores = np.zeros(n)
+    touched = np.zeros(n, dtype=bool)
+    for (_, _, fields, _), (ids, masks, term_scores) in zip(lists, arrays):
+        for key, weight, _ in fields:
+            # 同一计分表内文档号不重复，花式索引的 += 对每个文档只加一次
+            hit = (masks & FIELD_BITS[key]) != 0
+            doc_ids = ids[hit]
+            scores[doc_ids] += weight * term_scores[hit]
+            touched[doc_ids] = True
+    candidates = np.flatnonzero(touched)
+    tracing.count("candidates", len(candidates))
+    tracing.count("scored", len(candidates))
+    values = scores[candidates]
+    if len(candidates) > k:
+        top = np.argpartition(-values, k - 1)[:k]
+        keep = values >= values[top].min()
+        candidates, values = candidates[keep], values[keep]
+    order = np.lexsort((candidates, -values))[:k]
+    return [(int(candidates[i]), float(values[i]), doc_hits(lists, int(candidates[i]))) for i in order]
@@ -0,0 +1,127 @@
+# tracing.py
+# -*- coding: utf-8 -*-
+
+"""
+轻量的分阶段计时与计数
+
+    with tracing.record("search", query=q):     # 一条记录：一次查询、一次构建
+        with tracing.span("segment"):
+            ...
+        tracing.count("postings", n)
+
+未启用时 record()/span() 返回同一个空上下文管理器，count() 直接返回，开销只是一次全局变量判断。
+enable(path) 之后，每条记录结束时向 path 追加一行 JSON：
+    {"name": ..., 属性..., "total_ms": ..., "spans": {阶段: 毫秒}, "counters": {计数器: 值}}
+summary() 汇总全部记录中各阶段的次数、总耗时、平均耗时以及计数器总值。
+同一阶段在一条记录中出现多次时耗时累加；当前记录按线程区分，检索服务的多个线程互不干扰。
+"""
+
+import contextlib
+import json
+import threading
+import time
+
+_NULL = contextlib.nullcontext()
+_tracer = None
+
+class Tracer:
+    def __init__(self, path=None):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._out = open(path, "a", encoding="utf-8") if path else None
+        self.spans = {}         # 阶段 -> [次数, 总秒数]
+        self.counters = {}      # 计数器 -> 总值
+        self.last = None        # 最近结束的一条记录
+
+    def _current(self):
+        return getattr(self._local, "record", None)
+
+    @contextlib.contextmanager
+    def record(self, name, **attrs):
+        rec = {"spans": {}, "counters": {}}
+        outer = self._current()
+        self._local.record = rec
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - start
+            self._local.record = outer
+            line = {"name": name, **attrs, "total_ms": round(total * 1000, 3),
+                    "spans": {k: round(v * 1000, 3) for k, v in rec["spans"].items()},
+                    "counters": rec["counters"]}
+            with self._lock:
+                self.last = line
+                if self._out:
+                    self._out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    self._out.flush()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            rec = self._current()
+            if rec is not None:
+                rec["spans"][name] = rec["spans"].get(name, 0.0) + elapsed
+            with self._lock:
+                stat = self.spans.setdefault(name, [0, 0.0])
+                stat[0] += 1
+                stat[1] += elapsed
+
+    def count(self, name, n=1):
+        rec = self._current()
+        if rec is not None:
+            rec["counters"][name] = rec["counters"].get(name, 0) + n
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        with self._lock:
+            lines = [f"{'阶段':<20}{'次数':>8}{'总耗时ms':>12}{'平均ms':>10}"]
+            for name, (calls, total) in sorted(self.spans.items(), key=lambda x: -x[1][1]):
+                lines.append(f"{name:<20}{calls:>8}{total * 1000:>12.1f}{total / calls * 1000:>10.3f}")
+            if self.counters:
+                lines.append(f"{'计数器':<20}{'总值':>8}")
+                for name, value in sorted(self.counters.items()):
+                    lines.append(f"{name:<20}{value:>8}")
+        return "\n".join(lines)
+
+    def close(self):
+        if self._out:
+            self._out.close()
+            self._out = None
+
+def enable(path=None):
+    """开始记录；path 非空时每条记录追加一行 JSON 到该文件"""
+    global _tracer
+    disable()
+    _tracer = Tracer(path)
+    return _tracer
+
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = None
+
+def enabled():
+    return _tracer is not None
+
+def record(name, **attrs):
+    return _NULL if _tracer is None else _tracer.record(name, **attrs)
+
+def span(name):
+    return _NULL if _tracer is None else _tracer.span(name)
+
+def count(name, n=1):
+    if _tracer is not None:
+        _tracer.count(name, n)
+
+def last_record():
+    return None if _tracer is None else _tracer.last
+
+def summary():
+    return "" if _tracer is None else _tracer.summary()